@@ -1,8 +1,31 @@
 # ------------
 # Devin Suy 
 # ------------
-import random
-import matplotlib.pyplot as plt
+import os
+import sys
+import numpy as np
+from math import exp
+
+# Shared helpers live in probtools/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probtools import Population, ExperimentResult, pyplot, run_trials
+from probtools.combinatorics import ncr, log_ncr
+from probtools.adaptive import run_adaptive, proportion_precision
+from probtools.cache import cache_result
+from probtools.profiling import phases
+from probtools.render import show
+
+'''
+Exact probabilities
+-------------------
+Each question below is a ratio of binomial coefficients, evaluated in log space 
+so the terms stay finite for large populations
+'''
+# Probability that a sample of size k drawn without replacement from a population
+# of total members contains exactly x of the good members (hypergeometric)
+def hypergeom_pmf(x, good, total, k):
+    log_p = log_ncr(good, x) + log_ncr(total-good, k-x) - log_ncr(total, k)
+    return exp(log_p)
 
 '''
 A certain population consists of N=1000 people. 500 of them support party A; 300 of them
@@ -14,52 +37,110 @@ population. What is the probability that all persons in the group support {A, B,
 # hold the same party affiliation, False otherwise
 def full_support(sample): return len(set(sample)) == 1
 
-def party_support(N=1000, A=500, B=300, C=200, group=4, trials=100000):
+# Batched version of the trial loop: every row drawn from the multivariate
+# hypergeometric holds the number of A, B, C supporters in one sampled group,
+# a group is unanimous when one of its columns equals the group size. Trials
+# are generated block_size rows at a time so memory stays bounded, and the
+# blocks may be spread over worker processes
+def batch_support_count(population, group, trials, block_size=1000000, seed=None, workers=1):
+    unanimous = run_trials(support_block, trials, seed, workers, block_size, args=(population, group))
+    return {party : int(count) for party, count in zip(population.categories, unanimous)}
+
+# Number of unanimous groups per party over one block of trials
+def support_block(trials, rng, population, group):
+    groups = population.sample_counts(group, size=trials, rng=rng)
+    return np.count_nonzero(groups == group, axis=0)
+
+# Output the sampled probability of each party having unanimous support from our
+# trials, with the exact probabilities when they were computed
+def report_party_support(result):
+    params, support_count, exact_support = result.params, result.counts, result.exact
+    trials = params['trials']
+    print("Results\n-------")
+    if trials: print("Number of samples:", trials)
+    if 'stopped' in result.stats: 
+        print("Stopped on " + result.stats['stopped'] + ", interval half-width:", round(result.stats['precision'], 6))
+    print("Population size:", params['N'])
+    for party in ('A', 'B', 'C'):
+        print("Number of " + party + " supporters:", params[party])
+        if trials:
+            print("   Probability of full " + party + " support", round(support_count[party]/trials, 5), 
+                "(" + str(support_count[party]) + "/" + str(trials) + ")")
+        if exact_support:
+            print("   Exact probability of full " + party + " support", round(exact_support[party], 8))
+
+# Use exact=True for the closed form probabilities, add simulate=False to skip the trials.
+# With a tolerance (or time_budget in seconds) trials becomes a budget: batches are
+# drawn until every party's confidence interval half-width (relative to its
+# probability with relative=True) is within tolerance
+@cache_result(when=lambda p: p['batched'] or p['tolerance'] is not None or not p['simulate'], 
+    report=report_party_support)
+def party_support(N=1000, A=500, B=300, C=200, group=4, trials=100000, 
+    batched=False, block_size=1000000, seed=None, workers=1, exact=False, simulate=True, verbose=True,
+    tolerance=None, time_budget=None, relative=False, confidence=0.95):
     # Create the population with the given supporter values
-    population = []
-    for _ in range(A): population.append("A")
-    for _ in range(B): population.append("B")
-    for _ in range(C): population.append("C")
+    timer = phases("party_support")
+    population = Population({'A' : A, 'B' : B, 'C' : C})
+    supporters = {'A' : A, 'B' : B, 'C' : C}
+    timer.mark("population")
+
+    # Exact probability of a unanimous group: all group members come from one party
+    exact_support = {}
+    if exact:
+        for party, count in supporters.items():
+            exact_support[party] = hypergeom_pmf(group, count, population.size, group)
+    timer.mark("exact")
 
-    # Shuffle the population for randomized distribution
-    for _ in range(500): random.shuffle(population)
-    
-    # Randomly select group amount from the population, log the amount
-    # of times the entire selection contains all A, B, or C supporters
     support_count = {'A' : 0, 'B' : 0, 'C' : 0}
-    for _ in range(trials):
-        sample = random.sample(population, group)
-        # The sample is entirely affiliated, increment its count
-        if full_support(sample): support_count[sample[0]] += 1
+    adaptive = None
+    if simulate:
+        # Draw batches until the estimates reach the requested precision
+        if tolerance is not None or time_budget is not None:
+            adaptive = run_adaptive(support_block, trials, 
+                lambda counts, n: proportion_precision(counts, n, confidence, relative), 
+                tolerance, time_budget, seed, max_batch=block_size, args=(population, group))
+            support_count = {party : int(count) for party, count in zip(population.categories, adaptive.total)}
+            trials = adaptive.trials
+
+        # Draw all trials in NumPy blocks rather than one sample at a time
+        elif batched:
+            support_count = batch_support_count(population, group, trials, block_size, seed, workers)
+        else:
+            # Randomly select group amount from the population, log the amount
+            # of times the entire selection contains all A, B, or C supporters
+            for _ in range(trials):
+                sample = population.sample(group)
+                # The sample is entirely affiliated, increment its count
+                if full_support(sample): support_count[sample[0]] += 1
     
-    # Calculate probabilities
-    a_support = round(support_count['A']/trials, 5)
-    b_support = round(support_count['B']/trials, 5)
-    c_support = round(support_count['C']/trials, 5)
+        # Calculate probabilities
+        party_probs = {party : round(count/trials, 5) for party, count in support_count.items()}
+    else: party_probs = {party : round(p, 5) for party, p in exact_support.items()}
+    timer.mark("sampling", trials if simulate else 0, trials*group if simulate else 0)
 
-    # Output the sampled probability of each party having unanimous support from our trials
-    print("Results\n-------")
-    print("Number of samples:", trials)
-    print("Population size:", N)
-    print("Number of A supporters:", A)
-    print("   Probability of full A support", a_support, 
-        "(" + str(support_count['A']) + "/" + str(trials) + ")")
-    print("Number of B supporters:", B)
-    print("   Probability of full B support", b_support, 
-        "("+ str(support_count['B']) + "/" + str(trials) + ")")
-    print("Number of C supporters:", C)
-    print("   Probability of full C support", c_support, 
-        "(" + str(support_count['C']) + "/" + str(trials) + ")")
-
-    # Generate plot
-    plt.bar(x=['A','B','C'], height=[a_support, b_support, c_support])
+    result = ExperimentResult("party_support", 
+        params={'N' : N, 'A' : A, 'B' : B, 'C' : C, 'group' : group, 'trials' : trials if simulate else 0},
+        counts=support_count, probabilities=party_probs, exact=exact_support, 
+        stats=adaptive.stats() if adaptive else {})
+    if verbose: report_party_support(result)
+    timer.mark("output")
+    return result
+
+# Bar plot of the probability of unanimous support for each party
+def plot_party_support(result):
+    timer = phases("plot_party_support")
+    plt = pyplot()
+    params, party_probs = result.params, result.probabilities
+    plt.bar(x=list(party_probs.keys()), height=list(party_probs.values()))
     plt.title("Unanimous Party Support For Random Sample of Size=" 
-        + str(group) + " From Population Size N=" + str(N) + " Over Trials=" + str(trials))
+        + str(params['group']) + " From Population Size N=" + str(params['N']) + " Over Trials=" + str(params['trials']))
     plt.xlabel("Party Affiliation")
     plt.ylabel("Probability of Unanimous Support")
-    plt.show()
+    show(plt, timer)
 
-# party_support()
+# plot_party_support(party_support())
+# plot_party_support(party_support(trials=10000000, batched=True))
+# plot_party_support(party_support(exact=True))
 
 '''
 A class of 4n children contains 2n boys and 2n girls. A group of 2n children is chosen at random.
@@ -74,32 +155,50 @@ def has_equal(sample):
         else: counts['Boy'] += 1 
     return counts['Boy'] == counts['Girl']
 
-def class_select(select_scalar=2, boy_scalar=2, girl_scalar=2, N=10, trials=100000):
+def class_select(select_scalar=2, boy_scalar=2, girl_scalar=2, N=10, trials=100000, 
+    exact=False, simulate=True, verbose=True):
     # Let True represent a "boy", create population according to the ratios
-    population = []
-    for _ in range(boy_scalar*N): population.append(True)
-    for _ in range(girl_scalar*N): population.append(False)
-    
-    # Shuffle the population for randomized distribution
-    for _ in range(500): random.shuffle(population)
+    timer = phases("class_select")
+    population = Population({True : boy_scalar*N, False : girl_scalar*N})
+    select = select_scalar*N
+    timer.mark("population")
+
+    # Exact probability of drawing select/2 boys, impossible for an odd selection
+    if exact:
+        p_exact = 0.0
+        if select % 2 == 0: p_exact = hypergeom_pmf(select // 2, boy_scalar*N, population.size, select)
+    timer.mark("exact")
 
     # Randomly select select_scalar*N children trials amount of times, log the
     # amount of times the sample contains an equal amount of boys and girls 
-    equal_count = 0
-    for _ in range(trials):
-        sample = random.sample(population, (select_scalar*N))
-        if has_equal(sample): equal_count += 1
-    p_equal = round(equal_count/trials, 5)
+    if simulate:
+        equal_count = 0
+        for _ in range(trials):
+            sample = population.sample(select)
+            if has_equal(sample): equal_count += 1
+        p_equal = round(equal_count/trials, 5)
+        timer.mark("sampling", trials, trials*select)
 
     # Output results
-    print("Results\n-------")
-    print("Amount of boys:", str(boy_scalar) + "n")
-    print("Amount of girls:", str(girl_scalar) + "n")
-    print("Selection size:", str(select_scalar) + "n")
-    print("For values: n=" + str(N))
-    print("Number of trials:", trials)
-    print("\nProbability of equal distribution:", p_equal, 
-        "(" + str(equal_count) + "/" + str(trials) + ")")
+    if verbose:
+        print("Results\n-------")
+        print("Amount of boys:", str(boy_scalar) + "n")
+        print("Amount of girls:", str(girl_scalar) + "n")
+        print("Selection size:", str(select_scalar) + "n")
+        print("For values: n=" + str(N))
+        if simulate:
+            print("Number of trials:", trials)
+            print("\nProbability of equal distribution:", p_equal, 
+                "(" + str(equal_count) + "/" + str(trials) + ")")
+        if exact: print("Exact probability of equal distribution:", round(p_exact, 8))
+        timer.mark("output")
+
+    return ExperimentResult("class_select", 
+        params={'select_scalar' : select_scalar, 'boy_scalar' : boy_scalar, 'girl_scalar' : girl_scalar, 
+            'N' : N, 'trials' : trials if simulate else 0},
+        counts={'equal' : equal_count} if simulate else {},
+        probabilities={'equal' : p_equal} if simulate else {},
+        exact={'equal' : p_exact} if exact else {})
 
 # class_select()
 
@@ -108,27 +207,81 @@ In a lottery game, the player picks 4 numbers from a sequence of 1 through 20. A
 drawing, 4 balls are drawn at random from a box containing 20 balls numbered 1 through 20.
 What is the probability that the player will win the lottery (i.e. getting 4 matches in any order)?
 '''
-def lottery(min_number=1, max_number=20, draw_size=4, trials=100000):
-    # Generate randomized number pool
-    number_pool = [i for i in range(min_number, max_number+1)]
-    for _ in range(500): random.shuffle(number_pool)
+# Number of lottery wins over one block of trials. Every set of numbers is
+# equally likely to be drawn, so the player can keep the first draw_size numbers
+# of the pool. Each trial gives every ball a random key and the winning numbers
+# are the draw_size balls with the smallest keys, so the player wins when all
+# of their keys are below every other key
+def lottery_block(trials, rng, pool_size, draw_size):
+    keys = rng.random((trials, pool_size))
+    return int(np.count_nonzero(keys[:, :draw_size].max(axis=1) < keys[:, draw_size:].min(axis=1, initial=1)))
+
+def report_lottery(result):
+    params, trials = result.params, result.params['trials']
+    print("Results\n-------")
+    print("Number pool: [" + str(params['min_number']) + ", " + str(params['max_number']) + "]") 
+    print("Amount of numbers selected:", params['draw_size'])
+    if trials:
+        print("Number of trials:", trials)
+        if 'stopped' in result.stats: 
+            print("Stopped on " + result.stats['stopped'] + ", interval half-width:", round(result.stats['precision'], 6))
+        print("\nProbability of lottery win:", result.probabilities['win'], 
+            "(" + str(result.counts['win']) + "/" + str(trials) + ")")
+    if result.exact: print("Exact probability of lottery win:", round(result.exact['win'], 8))
+
+# batched=True draws blocks of about block_size random keys, one per ball per trial.
+# tolerance, time_budget, relative and confidence stop the trials early as in party_support
+@cache_result(when=lambda p: p['batched'] or p['tolerance'] is not None or not p['simulate'], 
+    report=report_lottery)
+def lottery(min_number=1, max_number=20, draw_size=4, trials=100000, exact=False, simulate=True, 
+    batched=False, block_size=2**22, seed=None, workers=1, verbose=True, 
+    tolerance=None, time_budget=None, relative=False, confidence=0.95):
+    # Number pool holding one ball of each number
+    timer = phases("lottery")
+    number_pool = Population({i : 1 for i in range(min_number, max_number+1)})
+    timer.mark("population")
+
+    # Exactly one of the nCr possible draws matches the player's numbers
+    if exact: p_exact = 1 / ncr(number_pool.size, draw_size)
+    timer.mark("exact")
+
+    # Draw batches until the win probability reaches the requested precision
+    block_rows = max(1, block_size // number_pool.size)
+    adaptive = None
+    if simulate and (tolerance is not None or time_budget is not None):
+        adaptive = run_adaptive(lottery_block, trials, 
+            lambda wins, n: proportion_precision(wins, n, confidence, relative), 
+            tolerance, time_budget, seed, max_batch=block_rows, args=(number_pool.size, draw_size))
+        win_count, trials = adaptive.total, adaptive.trials
+        p_win = round(win_count/trials, 5)
+
+    # Draw all trials in NumPy blocks, optionally over worker processes
+    elif simulate and batched:
+        win_count = run_trials(lottery_block, trials, seed, workers, block_rows, 
+            args=(number_pool.size, draw_size))
+        p_win = round(win_count/trials, 5)
 
     # For each trial, randomly select draw_size numbers for the player, then
     # draw_size numbers representing the the winning numbers
-    win_count = 0
-    for _ in range(trials):
-        player = set(random.sample(number_pool, draw_size))
-        winning = set(random.sample(number_pool, draw_size))
-        # Sets are unordered, winning numbers can match in any order
-        if player == winning: win_count += 1
-    p_win = round(win_count/trials, 5)
+    elif simulate:
+        win_count = 0
+        for _ in range(trials):
+            player = set(number_pool.sample(draw_size))
+            winning = set(number_pool.sample(draw_size))
+            # Sets are unordered, winning numbers can match in any order
+            if player == winning: win_count += 1
+        p_win = round(win_count/trials, 5)
+    timer.mark("sampling", trials if simulate else 0, 2*trials*draw_size if simulate else 0)
 
-    # Output results
-    print("Results\n-------")
-    print("Number pool: [" + str(min_number) + ", " + str(max_number) + "]") 
-    print("Amount of numbers selected:", draw_size)
-    print("Number of trials:", trials)
-    print("\nProbability of lottery win:", p_win, 
-        "(" + str(win_count) + "/" + str(trials) + ")")
-    
-lottery()
\ No newline at end of file
+    result = ExperimentResult("lottery", 
+        params={'min_number' : min_number, 'max_number' : max_number, 'draw_size' : draw_size, 
+            'trials' : trials if simulate else 0},
+        counts={'win' : int(win_count)} if simulate else {},
+        probabilities={'win' : p_win} if simulate else {},
+        exact={'win' : p_exact} if exact else {}, stats=adaptive.stats() if adaptive else {})
+    if verbose: report_lottery(result)
+    timer.mark("output")
+    return result
+
+if __name__ == "__main__":
+    lottery()
@@ -1,118 +1,199 @@
 from math import sqrt
 from collections import OrderedDict, defaultdict
-from matplotlib import pyplot as plt
+from functools import lru_cache
 import numpy as np
-import random
-import statistics
+import os
+import sys
+
+# Shared helpers live in probtools/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probtools.quantiles import z_scores, t_scores, z_interval, t_interval
+from probtools.popstore import make_population
+from probtools.runner import run_trials, seed_sequence
+from probtools.results import ExperimentResult
+from probtools.render import pyplot, show
+from probtools.cache import cache_result
+from probtools.profiling import phases
 
 # Using normal distr, calculate and return the confidence interval 
-# given the mean, s_dev, sample size, and desired confidence %
+# given the mean, s_dev, sample size, and desired confidence %.
+# Any confidence level is accepted, NumPy arrays of mu, sigma
+# and n return arrays of low and high values
 def get_confidence_z(mu, sigma, n, confidence):
-    confidence_vals = {.9 : 1.645, .95: 1.96, .9545: 2, .96: 2.05, .98: 2.33, .99 : 2.58, .9973: 3}
-    z_score = confidence_vals[confidence]
-
-    return [
-        mu - ((z_score * sigma) / sqrt(n)),
-        mu + ((z_score * sigma) / sqrt(n)) 
-    ]
+    low, high = z_interval(mu, sigma, n, confidence)
+    return [low, high]
 
 # Using t distr, calculate and return the confidence interval 
 # given the mean, s_dev, sample size, and desired confidence %
 def get_confidence_t(mu, sigma, n, confidence):
-    # Values from t table using v=n-1 dof
-    studT_95 = {5 : 2.78, 40: 2.02, 120 : 1.98}
-    studT_99 = {5 : 4.6, 40: 2.71, 120: 2.62}
-
-    if confidence == .95 and n in [5,40,120]: 
-        t_score = studT_95[n]
-    elif confidence == .99 and n in [5,40,120]:
-        t_score = studT_99[n]
-    else: return -1
-
-    return [
-        mu - ((t_score * sigma) / sqrt(n)),
-        mu + ((t_score * sigma) / sqrt(n)) 
-    ]
+    # Values from t distr using v=n-1 dof
+    low, high = t_interval(mu, sigma, n, confidence)
+    return [low, high]
     
+# Generator for drawing samples, spawned from seed so it stays independent
+# of the stream make_population uses to generate the population itself
+def sampling_rng(seed):
+    return np.random.default_rng(seed_sequence(seed).spawn(1)[0])
+
 # Assuming exact population parameters are given, randomly generate population
 # of size N and sample values from n = [1:MAX_SAMPLE], calculate population
-# means and plot along 95% and 99% confidence intervals
-def sample_size_confidence(mu=100, sigma=12, N=1000000, MAX_SAMPLE=200):
-    pop = list(np.random.normal(mu, sigma, N))
-
-    # Sample values and map sample size -> to sample_mean, and 
-    # sample size -> to [interval_95, interval_99] for values n = [1 : 200]
+# means along 95% and 99% confidence intervals. The population is a
+# NumPy array, pass store=True (or a directory) to reuse a memory-mapped copy
+@cache_result
+def sample_size_confidence(mu=100, sigma=12, N=1000000, MAX_SAMPLE=200, seed=None, store=None):
+    timer = phases("sample_size_confidence")
+    rng = sampling_rng(seed)
+    pop = make_population('normal', N, seed, store, mu=mu, sigma=sigma)
+    timer.mark("population", draws=N)
+
+    # Sample values and map sample size -> to sample_mean, and compute
+    # the [low, high] rows of interval_95, interval_99 for all n = [1 : 200] at once
+    n_vals = np.arange(1, MAX_SAMPLE+1)
     sample_data = OrderedDict()
-    sample_interval_95 = OrderedDict()
-    sample_interval_99 = OrderedDict()
+    sample_interval_95 = np.column_stack(get_confidence_z(mu, sigma, n_vals, 0.95))
+    sample_interval_99 = np.column_stack(get_confidence_z(mu, sigma, n_vals, 0.99))
+    timer.mark("statistics")
 
     for n in range(1, MAX_SAMPLE+1):
-        sample_interval_95[n] = get_confidence_z(mu, sigma, n, 0.95)
-        sample_interval_99[n] = get_confidence_z(mu, sigma, n, 0.99)
-        sample_data[n] = statistics.mean(random.sample(pop, n))
-    
-    # Generate plots, along 95 percent confidence interval, then 99
-    plt.scatter(sample_data.keys(), sample_data.values(), marker="x")
-    plt.plot(sample_interval_95.keys(), sample_interval_95.values(), 'r', linestyle='dashed')
-    plt.ylabel("X_Bar")
-    plt.xlabel("Sample Size")
-    plt.title("Sample Means and 95% Confidence Intervals (mu=" + str(mu) + ", sigma=" + str(sigma) + ", N=" + str(N) + ")")
-    plt.show()
-    plt.close()
-
-    plt.scatter(sample_data.keys(), sample_data.values(), marker="x")
-    plt.plot(sample_interval_99.keys(), sample_interval_99.values(), 'g', linestyle='dashed', )
-    plt.ylabel("X_Bar")
-    plt.xlabel("Sample Size")
-    plt.title("Sample Means and 99% Confidence Intervals (mu=" + str(mu) + ", sigma=" + str(sigma) + ", N=" + str(N) + ")")
-    plt.show()
-
-# sample_size_confidence()
-
-
-def normal_studT(mu=100, sigma=12, N=1000000, num_trials=10000, n_vals=[5,40,120]):
-    pop = list(np.random.normal(mu, sigma, N))
-
-    # Map the sample size n to the amount of successful trials
-    z_success_95 = OrderedDict([(5, 0), (40,0), (120,0)])
-    z_success_99 = OrderedDict([(5, 0), (40,0), (120,0)])
-    t_success_95 = OrderedDict([(5, 0), (40,0), (120,0)])
-    t_success_99 = OrderedDict([(5, 0), (40,0), (120,0)])
-
-    # Conduct trials, logging the amount of "successes"
-    for _ in range(num_trials):
-        for n in n_vals:
-            # Sample data and calculate parameters
-            sample = random.sample(pop, n)
-            sample_mean = statistics.mean(sample)
-            sample_sdev = statistics.stdev(sample)
-            
-            # Calculate intervals [low, high]
-            z_95 = get_confidence_z(sample_mean, sample_sdev, n, confidence=.95)
-            z_99 = get_confidence_z(sample_mean, sample_sdev, n, confidence=.99)
-            t_95 = get_confidence_t(sample_mean, sample_sdev, n, confidence=.95)
-            t_99 = get_confidence_t(sample_mean, sample_sdev, n, confidence=.99)
-
-            # Check if trial was success (whether or not the mu falls 
-            # within intervals), increment count if so
-            if (z_95[0] <= mu) and (mu <= z_95[1]): z_success_95[n] += 1
-            if (z_99[0] <= mu) and (mu <= z_99[1]): z_success_99[n] += 1
-            if (t_95[0] <= mu) and (mu <= t_95[1]): t_success_95[n] += 1
-            if (t_99[0] <= mu) and (mu <= t_99[1]): t_success_99[n] += 1
-
-    # Output results of simulation
-    print("RESULTS\n-------\n")
-    print("Normal distribution, 95% confidence:")
-    for n, success_count in z_success_95.items():
-        print("   n=" + str(n) + ": Success rate " + str(round(success_count/10000, 3)))
-    print("\nNormal distribution, 99% confidence:")
-    for n, success_count in z_success_99.items():
-        print("   n=" + str(n) + ": Success rate " + str(round(success_count/10000, 3)))
-    print("\nT distribution, 95% confidence:")
-    for n, success_count in t_success_95.items():
-        print("   n=" + str(n) + ": Success rate " + str(round(success_count/10000, 3)))
-    print("\nT distribution, 99% confidence:")
-    for n, success_count in t_success_99.items():
-        print("   n=" + str(n) + ": Success rate " + str(round(success_count/10000, 3)))
-
-normal_studT()
\ No newline at end of file
+        sample_data[n] = pop[rng.choice(N, n, replace=False)].mean()
+    timer.mark("sampling", MAX_SAMPLE, MAX_SAMPLE*(MAX_SAMPLE+1)//2)
+
+    return ExperimentResult("sample_size_confidence", params={'mu' : mu, 'sigma' : sigma, 'N' : N}, 
+        arrays={'n_vals' : n_vals, 'sample_means' : np.fromiter(sample_data.values(), dtype=np.float64),
+            'interval_95' : sample_interval_95, 'interval_99' : sample_interval_99})
+
+# Plot the sample means along 95 percent confidence interval, then 99
+def plot_sample_size_confidence(result):
+    timer = phases("plot_sample_size_confidence")
+    plt = pyplot()
+    params, arrays = result.params, result.arrays
+    for confidence, color in [(95, 'r'), (99, 'g')]:
+        plt.scatter(arrays['n_vals'], arrays['sample_means'], marker="x")
+        plt.plot(arrays['n_vals'], arrays['interval_' + str(confidence)], color, linestyle='dashed')
+        plt.ylabel("X_Bar")
+        plt.xlabel("Sample Size")
+        plt.title("Sample Means and " + str(confidence) + "% Confidence Intervals (mu=" + str(params['mu']) 
+            + ", sigma=" + str(params['sigma']) + ", N=" + str(params['N']) + ")")
+        show(plt, timer)
+        plt.close()
+
+# plot_sample_size_confidence(sample_size_confidence())
+
+
+# Coverage engine: for each sample size n draw a (trials, n) matrix of population
+# indices, reduce along axis 1 for every sample mean and sdev, then test all the
+# confidence levels at once. mu lies in [mean - c*sdev/sqrt(n), mean + c*sdev/sqrt(n)]
+# exactly when |mean - mu| <= c*sdev/sqrt(n). Rows are processed in chunks of about
+# chunk_size sampled values. Returns {'z' or 't' : {confidence : {n : success count}}}
+def coverage_counts(pop, mu, n_vals, num_trials, confidences=(.95, .99), chunk_size=2**22, seed=None):
+    rng = np.random.default_rng(seed)
+    pop = np.asarray(pop)
+    confidences = np.asarray(confidences)
+    z_crit = z_scores(confidences)
+    counts = {'z' : OrderedDict(), 't' : OrderedDict()}
+    for c in confidences:
+        counts['z'][float(c)] = OrderedDict()
+        counts['t'][float(c)] = OrderedDict()
+
+    for n in n_vals:
+        # Values from the t distribution using v=n-1 dof
+        t_crit = t_scores(confidences, n-1)
+        z_success = np.zeros(confidences.size, dtype=np.int64)
+        t_success = np.zeros(confidences.size, dtype=np.int64)
+
+        rows = max(1, chunk_size // n)
+        remaining = num_trials
+        while remaining > 0:
+            block = min(rows, remaining)
+            samples = pop[rng.integers(0, pop.size, size=(block, n))]
+            error = np.abs(samples.mean(axis=1) - mu)[:, None]
+            std_error = (samples.std(axis=1, ddof=1) / sqrt(n))[:, None]
+            z_success += np.count_nonzero(error <= z_crit * std_error, axis=0)
+            t_success += np.count_nonzero(error <= t_crit * std_error, axis=0)
+            remaining -= block
+
+        for i, c in enumerate(confidences):
+            counts['z'][float(c)][n] = int(z_success[i])
+            counts['t'][float(c)][n] = int(t_success[i])
+    return counts
+
+# Normal populations are cached per process, so repeated runs reuse them and
+# forked worker processes inherit the copy the parent already generated
+@lru_cache(maxsize=2)
+def cached_population(N, seed, store, mu, sigma):
+    return make_population('normal', N, seed, store, mu=mu, sigma=sigma)
+
+# An unseeded population is drawn afresh, caching it would hand every later
+# unseeded call the same "random" population
+def normal_population(N, seed, store, mu, sigma):
+    if seed is None: return make_population('normal', N, seed, store, mu=mu, sigma=sigma)
+    return cached_population(N, seed, store, mu, sigma)
+
+# Coverage counts over one block of trials, for run_trials
+def coverage_block(trials, rng, pop_key, mu, n_vals, confidences):
+    return coverage_counts(cached_population(*pop_key), mu, n_vals, trials, confidences, seed=rng)
+
+# Output results of simulation
+def report_normal_studT(result):
+    print("RESULTS\n-------", end="")
+    for family, name in [('z', "Normal"), ('t', "T")]:
+        for confidence, rates in result.probabilities[family].items():
+            print("\n" + name + " distribution, " + str(round(confidence*100, 2)) + "% confidence:")
+            for n, rate in rates.items():
+                print("   n=" + str(n) + ": Success rate " + str(round(rate, 3)))
+
+@cache_result(report=report_normal_studT)
+def normal_studT(mu=100, sigma=12, N=1000000, num_trials=10000, n_vals=[5,40,120], 
+    vectorized=False, confidences=(.95, .99), seed=None, store=None, workers=1, trial_chunk=4096, verbose=True):
+    timer = phases("normal_studT")
+    if vectorized:
+        # Every worker must see the same population, so fix a seed for it. A stored
+        # population needs the caller's seed, one made up here would never be read again
+        if seed is None and store: raise ValueError("Stored populations need a seed to be reproducible")
+        if seed is None: seed = np.random.SeedSequence().entropy
+        pop_key = (N, seed, store, mu, sigma)
+        cached_population(*pop_key)
+        timer.mark("population", draws=N)
+        counts = run_trials(coverage_block, num_trials, seed, workers, trial_chunk, 
+            args=(pop_key, mu, tuple(n_vals), tuple(confidences)))
+    else:
+        rng = sampling_rng(seed)
+        pop = normal_population(N, seed, store, mu, sigma)
+        timer.mark("population", draws=N)
+
+        # Map each confidence level to the sample size n to the amount of
+        # successful trials, keyed as coverage_counts keys them
+        counts = {family : OrderedDict([(float(c), OrderedDict([(n, 0) for n in n_vals])) for c in confidences]) 
+            for family in ('z', 't')}
+
+        # Conduct trials, logging the amount of "successes"
+        for _ in range(num_trials):
+            for n in n_vals:
+                # Sample data and calculate parameters
+                sample = pop[rng.choice(N, n, replace=False)]
+                sample_mean = sample.mean()
+                sample_sdev = sample.std(ddof=1)
+
+                for c in counts['z']:
+                    # Calculate intervals [low, high]
+                    z = get_confidence_z(sample_mean, sample_sdev, n, confidence=c)
+                    t = get_confidence_t(sample_mean, sample_sdev, n, confidence=c)
+
+                    # Check if trial was success (whether or not the mu falls 
+                    # within intervals), increment count if so
+                    if (z[0] <= mu) and (mu <= z[1]): counts['z'][c][n] += 1
+                    if (t[0] <= mu) and (mu <= t[1]): counts['t'][c][n] += 1
+    timer.mark("sampling", num_trials, num_trials*sum(n_vals))
+
+    # Success rates keyed the same way as the counts
+    rates = {family : {confidence : {n : success_count/num_trials for n, success_count in successes.items()} 
+        for confidence, successes in by_confidence.items()} for family, by_confidence in counts.items()}
+    result = ExperimentResult("normal_studT", 
+        params={'mu' : mu, 'sigma' : sigma, 'N' : N, 'num_trials' : num_trials, 'n_vals' : list(n_vals)},
+        counts=counts, probabilities=rates)
+    if verbose: report_normal_studT(result)
+    timer.mark("output")
+    return result
+
+if __name__ == "__main__":
+    normal_studT()
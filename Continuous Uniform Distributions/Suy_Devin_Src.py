@@ -1,61 +1,89 @@
-from scipy.stats import uniform as uni
-from collections import OrderedDict
-from matplotlib import pyplot as plt
 import numpy as np
-import random 
-
-# Non uniform PDF and CDF using psuedo-randomization 
-def psuedo_rand(a=1, b=10, n=1000000):
-    # Initialization
-    occurrences = OrderedDict()
-    rand_vals = [None] * n
-    ptr = 0
-    for x in range(a, b+1): occurrences[x] = 0
-    
-    # Randomly generate n values [a,b] and map the number
-    # to the amount of times it was generated
-    for _ in range(n):
-        rand_vals[ptr] = random.randint(a, b)
-        ptr += 1
-    for x in rand_vals: occurrences[x] += 1
-
-    # Map each number to the percentage that it occurs,
-    # the probability of each number in our sample
-    pdf_pcts = {}
-    for x, occurr in occurrences.items():
-        pdf_pcts[x] = round(occurr/n, 4)
-
-    # Calculate CDF values from our probabilities by
-    # mapping the value to a running sum
-    cdf_pcts = {}
-    p_sum = 0
-    for x, pct in pdf_pcts.items():
-        p_sum += pct
-        cdf_pcts[x] = round(p_sum, 4)
+import time
+import os
+import sys
 
-    # Output results
+# Shared helpers live in probtools/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probtools import ExperimentResult, pyplot, run_trials
+from probtools.adaptive import run_adaptive, proportion_precision
+from probtools.cache import cache_result
+from probtools.profiling import phases
+from probtools.render import show
+
+# Output results, with the PDF and CDF rounded to percentages
+def report_psuedo_rand(result):
+    params, arrays = result.params, result.arrays
+    x_vals = arrays['x'].tolist()
     print("Results\n-------")
     print("Using psuedo-randomization")
-    print("Random values between [" + str(a) + ", " + str(b) + "]")
-    print("Number of values selected:", n)
-    print("PDF f(x):", pdf_pcts)
-    print("CDF F(x):", cdf_pcts)
+    print("Random values between [" + str(params['a']) + ", " + str(params['b']) + "]")
+    print("Number of values selected:", params['n'])
+    print("Throughput:", format(round(result.stats['draws_per_sec']), ","), "draws/sec")
+    print("PDF f(x):", dict(zip(x_vals, np.round(arrays['pdf'], 4).tolist())))
+    print("CDF F(x):", dict(zip(x_vals, np.round(arrays['cdf'], 4).tolist())))
+
+# Non uniform PDF and CDF using psuedo-randomization. Values are generated
+# chunk_size at a time and tallied with np.bincount, so memory stays at a few
+# MB however large n is, and the PDF and CDF are kept at full precision
+@cache_result(report=report_psuedo_rand)
+def psuedo_rand(a=1, b=10, n=1000000, chunk_size=2**20, seed=None, verbose=True):
+    timer = phases("psuedo_rand")
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    # Randomly generate n values [a,b] and count the amount
+    # of times each number was generated
+    counts = np.zeros(b-a+1, dtype=np.int64)
+    remaining = n
+    while remaining > 0:
+        chunk = min(chunk_size, remaining)
+        counts += np.bincount(rng.integers(0, b-a+1, size=chunk), minlength=b-a+1)
+        remaining -= chunk
+    elapsed = time.perf_counter() - start
+    timer.mark("sampling", n, n)
 
-    # Plot PDF and CDF horizontally
+    # The probability of each number in our sample, and its
+    # running sum for the CDF
+    x_vals = np.arange(a, b+1)
+    pdf_vals = counts / n
+    cdf_vals = np.cumsum(counts) / n
+
+    draws_per_sec = n / max(elapsed, 1e-9)
+    timer.mark("aggregation")
+
+    result = ExperimentResult("psuedo_rand", params={'a' : a, 'b' : b, 'n' : n}, 
+        arrays={'x' : x_vals, 'counts' : counts, 'pdf' : pdf_vals, 'cdf' : cdf_vals},
+        stats={'draws_per_sec' : draws_per_sec})
+    if verbose: report_psuedo_rand(result)
+    timer.mark("output")
+    return result
+
+# Plot a PDF and CDF horizontally, shared by the experiments below
+def plot_pdf_cdf(x_vals, pdf_vals, cdf_vals, pdf_title, cdf_title):
+    timer = phases("plot_pdf_cdf")
+    plt = pyplot()
     plt.subplot(1,2,1)
-    plt.title("PDF (Psuedo-random) For [" + str(a) + ", " + str(b) + "] Over n=" + str(n) + " Trials")
-    plt.plot(pdf_pcts.keys(), pdf_pcts.values(), 'r-')
+    plt.title(pdf_title)
+    plt.plot(x_vals, pdf_vals, 'r-')
     plt.xlabel("Interval Values")
     plt.ylabel("f(x)")
 
     plt.subplot(1,2,2)
-    plt.title("CDF (Psuedo-random) For [" + str(a) + ", " + str(b) + "] Over n=" + str(n) + " Trials")
-    plt.plot(cdf_pcts.keys(), cdf_pcts.values(), 'b-')
+    plt.title(cdf_title)
+    plt.plot(x_vals, cdf_vals, 'b-')
     plt.xlabel("Interval Values")
     plt.ylabel("F(x)")
-    plt.show()
+    show(plt, timer)
 
-# psuedo_rand()
+def plot_psuedo_rand(result):
+    a, b, n = result.params['a'], result.params['b'], result.params['n']
+    interval = "[" + str(a) + ", " + str(b) + "] Over n=" + str(n) + " Trials"
+    plot_pdf_cdf(result.arrays['x'], result.arrays['pdf'], result.arrays['cdf'], 
+        "PDF (Psuedo-random) For " + interval, "CDF (Psuedo-random) For " + interval)
+
+# plot_psuedo_rand(psuedo_rand())
+# plot_psuedo_rand(psuedo_rand(n=10**10))
 
 '''
 A random variable that is uniformly distributed over the interval (a, b) follows the probability density
@@ -72,112 +100,197 @@ The cumulative distribution function (cdf) for a uniform random variable is:
 Python implementation for (a, b) = (1, 10)
 '''
 
-# Utility functions implementing the above equations
-def get_uni_pdf(a, b):
-    return round(1/(b-a), 4)
+# Utility functions implementing the above equations,
+# evaluated elementwise over a scalar or array of x values
+def get_uni_pdf(x, a, b):
+    x = np.asarray(x, dtype=np.float64)
+    return np.where((x > a) & (x < b), 1/(b-a), 0.0)
 def get_uni_cdf(x, a, b):
-    return round((x-a)/(b-a), 4)
+    return np.clip((np.asarray(x, dtype=np.float64)-a)/(b-a), 0, 1)
 
-def uniform_eq(a=1, b=10, n=1000000):
+# The x values with their PDF f(x) and CDF F(x) values as arrays
+def uniform_eq(a=1, b=10, n=1000000, verbose=True):
+    timer = phases("uniform_eq")
     x_vals = np.linspace(a-1, b+1, n)
-    # PDF map values to uniform distribution f(x)
-    pdf_pcts = {}
-    pdf_val = get_uni_pdf(a, b)
-    for x in x_vals: 
-        if x > a and x < b: pdf_pcts[x] = pdf_val
-        else: pdf_pcts[x] = 0
-
-    # CDF map values to uniform distrubtion F(x)
-    cdf_pcts = {}
-    for x in x_vals:
-        if x > a and x < b: cdf_pcts[x] = get_uni_cdf(x, a, b)
-        elif x <= a: cdf_pcts[x] = 0
-        elif x >= b: cdf_pcts[x] = 1
+    pdf_vals = get_uni_pdf(x_vals, a, b)
+    cdf_vals = get_uni_cdf(x_vals, a, b)
+    timer.mark("evaluation")
 
     # Output results
-    print("Results\n-------")
-    print("Uniform Implementation")
-    print("Values on interval (" + str(a) + ", " + str(b) + ")")
-    print("Number of values: n =", n)
-    # print("PDF f(x):", pdf_pcts)
-    # print("CDF F(x):", cdf_pcts)
+    if verbose:
+        print("Results\n-------")
+        print("Uniform Implementation")
+        print("Values on interval (" + str(a) + ", " + str(b) + ")")
+        print("Number of values: n =", n)
+    timer.mark("output")
 
-    # Plot PDF and CDF horizontally
-    plt.subplot(1,2,1)
-    plt.title("Uniform Probability Density Function For (" + str(a) + ", " + str(b) + ") Over n=" + str(n) + " values")
-    plt.plot(pdf_pcts.keys(), pdf_pcts.values(), 'r-')
-    plt.xlabel("Interval Values")
-    plt.ylabel("f(x)")
+    return ExperimentResult("uniform_eq", params={'a' : a, 'b' : b, 'n' : n}, 
+        arrays={'x' : x_vals, 'pdf' : pdf_vals, 'cdf' : cdf_vals})
 
-    plt.subplot(1,2,2)
-    plt.title("Cumulative Distribution Function For (" + str(a) + ", " + str(b) + ") Over n=" + str(n) + " values")
-    plt.plot(cdf_pcts.keys(), cdf_pcts.values(), 'b-')
-    plt.xlabel("Interval Values")
-    plt.ylabel("F(x)")
-    plt.show()
+def plot_uniform_eq(result):
+    a, b, n = result.params['a'], result.params['b'], result.params['n']
+    interval = "(" + str(a) + ", " + str(b) + ") Over n=" + str(n) + " values"
+    scipy = " (scipy)" if result.experiment == "uniform_stats" else ""
+    plot_pdf_cdf(result.arrays['x'], result.arrays['pdf'], result.arrays['cdf'], 
+        "Uniform Probability Density Function" + scipy + " For " + interval, 
+        "Cumulative Distribution Function" + scipy + " For " + interval)
 
-# uniform_eq()
+# plot_uniform_eq(uniform_eq())
 
 '''
 Implementation using scipy.stats.uniform pdf() and cdf() functions
 over specified n evenly spaced values 
 '''
 def uniform_stats(a=1, b=10, n=1000000):
+    from scipy.stats import uniform as uni
     x = np.linspace(a-1, b+1, n)
     pdf_y = uni.pdf(x, a, b-a)
     cdf_y = uni.cdf(x, a, b-a)
+    return ExperimentResult("uniform_stats", params={'a' : a, 'b' : b, 'n' : n}, 
+        arrays={'x' : x, 'pdf' : pdf_y, 'cdf' : cdf_y})
 
-    # Plot PDF and CDF horizontally
-    plt.subplot(1,2,1)
-    plt.title("Uniform Probability Density Function (scipy) For (" + str(a) + ", " + str(b) + ") Over n=" + str(n) + " values")
-    plt.plot(x, pdf_y, 'r-')
-    plt.xlabel("Interval Values")
-    plt.ylabel("f(x)")
+# plot_uniform_eq(uniform_stats())
 
-    plt.subplot(1,2,2)
-    plt.title("Cumulative Distribution Function (scipy) For (" + str(a) + ", " + str(b) + ") Over n=" + str(n) + " values")
-    plt.plot(x, cdf_y, 'b-')
-    plt.xlabel("Interval Values")
-    plt.ylabel("F(x)")
-    plt.show()
+# Verify values obtained against scipy.stats.uniform, the PDF is compared away from
+# x = a and x = b where our open interval (a, b) and scipy's closed [a, b] differ
+def show_verification(a=1, b=10, n=1000000):
+    ours, scipy = uniform_eq(a, b, n, verbose=False).arrays, uniform_stats(a, b, n).arrays
+    x, pdf_y, cdf_y = ours['x'], ours['pdf'], ours['cdf']
+    scipy_pdf, scipy_cdf = scipy['pdf'], scipy['cdf']
+    interior = (x != a) & (x != b)
+
+    pdf_ok = np.allclose(pdf_y[interior], scipy_pdf[interior])
+    cdf_ok = np.allclose(cdf_y, scipy_cdf)
+    print("\nVerification Against scipy.stats.uniform\n----------------------------------------")
+    print("   PDF max difference:", np.max(np.abs(pdf_y[interior] - scipy_pdf[interior])), "(match)" if pdf_ok else "(MISMATCH)")
+    print("   CDF max difference:", np.max(np.abs(cdf_y - scipy_cdf)), "(match)" if cdf_ok else "(MISMATCH)")
+    return pdf_ok and cdf_ok
 
-# uniform_stats()
+# show_verification()
 
 '''
 Points are selected at random from the circumference of a circle. 
 Simulate the probability that the three points lie on the same semicircle
 '''
-# All points are are on the same semi circle if the distance from the middle 
-# point to the min and max point is no more than the semicricle length
+# All points are on the same semi circle exactly when some gap between
+# neighboring points (going around the circle, including the wrap from the last
+# point back to the first) is at least the semicircle length. Works for any
+# number of points
 def same_semi(points, semi_len):
-    points.sort()
-    mid = int(len(points) / 2)
-    return points[mid] - points[0] < semi_len and points[-1] - points[mid] < semi_len
+    points = np.sort(points)
+    wrap_gap = 2*semi_len - (points[-1] - points[0])
+    return max(np.max(np.diff(points), initial=0), wrap_gap) >= semi_len
+
+# Batched version over every k in k_vals at once. Each trial is a row of points
+# (as fractions of the circumference) and the first k points of a row serve as its
+# trial for k points, so all k share the same draws. If the first k points lie on
+# one semicircle so do the first k-1, so a row only draws points until they stop
+# fitting, and few rows get past the first handful. A trial for k points succeeds
+# when at least k points of its row fit. Chunks of rows may be spread over worker
+# processes, a chunk holds about chunk_size points as rows rarely need more than four.
+# Returns {k : number of trials whose points lie on one semicircle}
+def batch_same_semi(k_vals, n, chunk_size=2**22, seed=None, workers=1):
+    rows = max(1, chunk_size // 4)
+    return run_trials(same_semi_block, n, seed, workers, rows, args=(tuple(k_vals),))
+
+# Each row keeps the smallest arc [start, start + width] covering its points so far.
+# A new point either falls inside the arc or extends it forward or backward,
+# whichever is shorter, and the points fit while the arc is at most a semicircle
+def same_semi_block(trials, rng, k_vals):
+    start, width = rng.random(trials), np.zeros(trials)
+    rows = np.arange(trials)
+    fitted = np.ones(trials, dtype=np.int64)
+    for count in range(2, max(k_vals)+1):
+        x = rng.random(rows.size)
+        ahead = x - start
+        ahead += ahead < 0
+        behind = width + 1 - ahead
+        outside = ahead > width
+        start = np.where(outside & (behind < ahead), x, start)
+        width = np.where(outside, np.minimum(ahead, behind), width)
+        fits = width <= 0.5
+        rows, start, width = rows[fits], start[fits], width[fits]
+        fitted[rows] = count
+        if rows.size == 0: break
+    return {k : int(np.count_nonzero(fitted >= k)) for k in k_vals}
+
+# Output results
+def report_semi_circle(result):
+    params, n, same_semi_count = result.params, result.params['n'], result.counts['same_semi']
+    circumference = 2 * np.pi * params['r']
+    print("Results\n-------")
+    print("Randomly selected points:", params['num_points'])
+    print("Circle Radius:", round(params['r'], 3))
+    print("Circumference:", round(circumference, 3))
+    print("Semicircle length:", round(circumference / 2, 3))
+    print("\nNumber of trials: n =", n)
+    if 'stopped' in result.stats: 
+        print("Stopped on " + result.stats['stopped'] + ", interval half-width:", round(result.stats['precision'], 6))
+    print("Probability of same semicircle:", result.probabilities['same_semi'], 
+    "(" + str(same_semi_count) + "/" + str(n) + ")")
+    print("Exact probability k/2^(k-1):", round(result.exact['same_semi'], 3))
 
-def semi_circle(num_points=3, r = 3, n=100000):
+# With a tolerance (or time_budget in seconds) n becomes a budget: trials are run in
+# batches until the confidence interval half-width of the probability (relative to
+# it with relative=True) is within tolerance
+@cache_result(when=lambda p: p['vectorized'] or p['tolerance'] is not None, report=report_semi_circle)
+def semi_circle(num_points=3, r = 3, n=100000, vectorized=False, seed=None, workers=1, verbose=True, 
+    tolerance=None, time_budget=None, relative=False, confidence=0.95):
     # Calculate the circumference, and length of a semicircle
+    timer = phases("semi_circle")
     circumference = 2 * np.pi * r
     semi_len = circumference / 2
-    same_semi_count = 0
-
-    # Perform n trials of randomly selecting num_points
-    for _ in range(n):
-        # Randomly select three values on the circumference, assuming
-        # 12 o'clock position as 0 with increasing values moving clockwise
-        # rand_pts = np.random.uniform(0, 360, num_points)
-        rand_pts = np.random.uniform(0, circumference, num_points)
-        if same_semi(rand_pts, semi_len): same_semi_count += 1
+
+    adaptive = None
+    if tolerance is not None or time_budget is not None:
+        adaptive = run_adaptive(same_semi_block, n, 
+            lambda counts, trials: proportion_precision(counts[num_points], trials, confidence, relative), 
+            tolerance, time_budget, seed, max_batch=max(1, 2**22 // num_points), args=((num_points,),))
+        same_semi_count, n = adaptive.total[num_points], adaptive.trials
+    elif vectorized:
+        same_semi_count = batch_same_semi([num_points], n, seed=seed, workers=workers)[num_points]
+    else:
+        same_semi_count = 0
+        # Perform n trials of randomly selecting num_points
+        for _ in range(n):
+            # Randomly select three values on the circumference, assuming
+            # 12 o'clock position as 0 with increasing values moving clockwise
+            # rand_pts = np.random.uniform(0, 360, num_points)
+            rand_pts = np.random.uniform(0, circumference, num_points)
+            if same_semi(rand_pts, semi_len): same_semi_count += 1
+    timer.mark("sampling", n, n*num_points)
     p_same_semi = round(same_semi_count / n, 3)
     
-    # Output results
-    print("Results\n-------")
-    print("Randomly selected points:", num_points)
-    print("Circle Radius:", round(r, 3))
-    print("Circumference:", round(circumference, 3))
-    print("Semicircle length:", round(semi_len, 3))
-    print("\nNumber of trials: n =", n)
-    print("Probability of same semicircle:", p_same_semi, 
-    "(" + str(same_semi_count) + "/" + str(n) + ")")
+    p_exact = num_points / 2**(num_points-1)
+
+    result = ExperimentResult("semi_circle", params={'num_points' : num_points, 'r' : r, 'n' : n}, 
+        counts={'same_semi' : same_semi_count}, probabilities={'same_semi' : p_same_semi}, 
+        exact={'same_semi' : p_exact}, stats=adaptive.stats() if adaptive else {})
+    if verbose: report_semi_circle(result)
+    timer.mark("output")
+    return result
 
 # semi_circle()
 
+def report_semi_circle_sweep(result):
+    print("Results\n-------")
+    print("Number of trials: n =", result.params['n'])
+    for k, p in result.probabilities.items():
+        print("   k=" + str(k) + ": Probability of same semicircle", round(p, 5), 
+            "(exact " + str(round(result.exact[k], 5)) + ")")
+
+# Probability of k points on the same semicircle for every k in k_vals, estimated
+# from one shared batch of draws, alongside the exact value k/2^(k-1)
+@cache_result(report=report_semi_circle_sweep)
+def semi_circle_sweep(k_vals=range(1, 11), n=100000, seed=None, workers=1, verbose=True):
+    timer = phases("semi_circle_sweep")
+    same_semi_counts = batch_same_semi(list(k_vals), n, seed=seed, workers=workers)
+    timer.mark("sampling", n, n*max(k_vals))
+    result = ExperimentResult("semi_circle_sweep", params={'k_vals' : list(k_vals), 'n' : n}, 
+        counts=same_semi_counts, probabilities={k : count / n for k, count in same_semi_counts.items()},
+        exact={k : k / 2**(k-1) for k in same_semi_counts})
+    if verbose: report_semi_circle_sweep(result)
+    timer.mark("output")
+    return result
+
+# semi_circle_sweep()
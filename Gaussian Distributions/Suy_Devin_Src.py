@@ -1,25 +1,40 @@
-from scipy import stats
-from math import erf, floor, ceil, sqrt, pi, e
-from matplotlib import pyplot as plt
-from collections import OrderedDict
+from scipy.special import ndtr, gammainc, gammaincc
+from math import sqrt, pi
 import numpy as np
+import os
+import sys
+
+# Shared helpers live in probtools/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probtools import ExperimentResult, irwin_hall_pdf, pyplot, run_trials, seed_sequence
+from probtools.adaptive import run_adaptive, mean_precision
+from probtools.accumulators import Moments, MinMax, Histogram, QuantileSketch
+from probtools.cache import cache_result
+from probtools.profiling import phases
+from probtools.render import show
 
 '''
 ----------------------------
 Normal Gaussian Distribution
 ----------------------------
 '''
-# Implementation of probability density function f(x) 
+# Implementation of probability density function f(x), x, mu and
+# var may be scalars or arrays and are broadcast together
 def pdf(x, mu=0, var=1):
-    exponent = (-1 * pow((x-mu), 2)) / (2 * var)
-    return (1 / sqrt(2*pi*var)) * pow(e, exponent)
+    return np.exp(logpdf(x, mu, var))
+
+# Natural log of f(x), stays finite far into the tails where f(x) underflows
+def logpdf(x, mu=0, var=1):
+    x, mu, var = np.asarray(x), np.asarray(mu), np.asarray(var)
+    return -np.square(x-mu) / (2 * var) - 0.5 * np.log(2*pi*var)
 
 # Implementation of cumulative distribution function F(x)
 def cdf(x, mu=0, var=1):
-    return 0.5 + (0.5 * erf((x-mu) / sqrt(2*var)))
+    return ndtr((np.asarray(x)-mu) / np.sqrt(var))
 
 # Verify values obtained against scipy.stats.normal module
 def show_verification():
+    from scipy import stats
     print("PDF Implementation\n------------------")
     print("Probability Density Function @ x=1, mu=0, variance=1")
     print("   Using self implementation :", pdf(1))
@@ -33,58 +48,50 @@ def show_verification():
 # show_verification()
 
 
-# Given a range [start_val, end_val] returns a data dictionary
-# mapping input -> pdf/cdf output vals for each val in the range 
+# Given a range [start_val, end_val] returns the input values and
+# the pdf/cdf output vals for each val in the range as arrays. mu and
+# var may be column arrays, giving one row of output per parameter pair
 def get_plot(start_val, end_val, use_pdf=True, mu=0, var=1):
-    output = {}
-    # Map using probability density function
-    if use_pdf:
-        for val in np.linspace(start_val, end_val, 10000): output[val] = pdf(val, mu, var)
-        
-    # Map values using cumulative distribution function
-    else:
-        for val in np.linspace(start_val, end_val, 10000): output[val] = cdf(val, mu, var)
-
-    return output 
-
-# Generate pdf/cdf plots for the specified (mu, variance) pairs
+    x_vals = np.linspace(start_val, end_val, 10000)
+    if use_pdf: return x_vals, pdf(x_vals, mu, var)
+    return x_vals, cdf(x_vals, mu, var)
+
+# Generate pdf/cdf curves for the specified (mu, variance) pairs
+@cache_result
 def generate_all_plots(start_val=-6, end_val=6):
+    timer = phases("generate_all_plots")
     # Maps argument ID to mu, variance arguments
     mu_var = {
         0 : [0,1], 1 : [0, 0.1], 2 : [0, 0.01], 3 : [-3, 1], 4 : [-3, 0.1], 5 : [-3, 0.01]
     }
-    # Maps mu_var argument ID to the corresponding plot values
-    plot_vals_pdf = OrderedDict()
-    plot_vals_cdf = OrderedDict()
-    x_vals = np.linspace(start_val, end_val, 10000)
-
-    # Generate plots for each of our mu, variance settings
-    for i in range(len(mu_var)):
-        params = mu_var[i]
-        plot_vals_pdf[i] = get_plot(start_val, end_val, use_pdf=True, mu=params[0], var=params[1])
-        plot_vals_cdf[i] = get_plot(start_val, end_val, use_pdf=False, mu=params[0], var=params[1])
-
-    # Plot PDF results for each parameter
-    for i in range(len(mu_var)):
-        mu, var = mu_var[i]
-        plt.plot(x_vals, plot_vals_pdf[i].values(), label=("mu=" + str(mu) + ", var=" + str(var)))
-    plt.title("Probability Density Function Over [" + str(start_val) + ", " + str(end_val) + "]")
-    plt.xlabel("Interval Values")
-    plt.ylabel("f(x)")
-    plt.legend()
-    plt.show()
-
-    # Plot CDF results for each parameter
-    for i in range(len(mu_var)):
-        mu, var = mu_var[i]
-        plt.plot(x_vals, plot_vals_cdf[i].values(), label=("mu=" + str(mu) + ", var=" + str(var)))
-    plt.title("Cumulative Distribution Function Over [" + str(start_val) + ", " + str(end_val) + "]")
-    plt.xlabel("Interval Values")
-    plt.ylabel("F(x)")
-    plt.legend()
-    plt.show()
-
-# generate_all_plots()
+    # Evaluate every mu, variance setting at once as (6, 10000) arrays,
+    # row i holds the plot values for argument ID i
+    params = np.array([mu_var[i] for i in range(len(mu_var))])
+    mu_col, var_col = params[:, :1], params[:, 1:]
+    x_vals, plot_vals_pdf = get_plot(start_val, end_val, use_pdf=True, mu=mu_col, var=var_col)
+    x_vals, plot_vals_cdf = get_plot(start_val, end_val, use_pdf=False, mu=mu_col, var=var_col)
+    timer.mark("evaluation")
+    return ExperimentResult("generate_all_plots", 
+        params={'start_val' : start_val, 'end_val' : end_val, 'mu_var' : [mu_var[i] for i in range(len(mu_var))]},
+        arrays={'x' : x_vals, 'pdf' : plot_vals_pdf, 'cdf' : plot_vals_cdf})
+
+# Plot PDF results for each parameter, then CDF results
+def plot_all_plots(result):
+    timer = phases("plot_all_plots")
+    plt = pyplot()
+    params, arrays = result.params, result.arrays
+    interval = " Over [" + str(params['start_val']) + ", " + str(params['end_val']) + "]"
+    for key, title, label in [('pdf', "Probability Density Function", "f(x)"), 
+        ('cdf', "Cumulative Distribution Function", "F(x)")]:
+        for i, (mu, var) in enumerate(params['mu_var']):
+            plt.plot(arrays['x'], arrays[key][i], label=("mu=" + str(mu) + ", var=" + str(var)))
+        plt.title(title + interval)
+        plt.xlabel("Interval Values")
+        plt.ylabel(label)
+        plt.legend()
+        show(plt, timer)
+
+# plot_all_plots(generate_all_plots())
 
 
 
@@ -134,38 +141,110 @@ def book_stack(n_vals=[1,5,15], a=1, b=3):
 
 # Perform N samples of size n to generate probability 
 # histogram and plot of normal PDF f(x)
-def run_simu_util(n, a=1, b=3, N=100000):
-    mean = stack_mean(n, a, b)
-    s_dev = stack_sdev(n, a, b)
-
-    # Randomly sample n values from [a,b]
-    s_vals = []
-    for _ in range(N): s_vals.append(np.sum(np.random.uniform(a, b, n)))
-
-    # Generate histogram bars
-    hist, b_edges = np.histogram(a=s_vals, bins=np.linspace(n*a, n*b, 31), density=True)
-    bar = (b_edges[:-1]+b_edges[1:]) / 2
-    w = bar[1]-bar[0] 
-
-    return [mean, s_dev, hist, b_edges, bar, w]
-
-# Run the simulation for each n value
-def run_book_simu(n_vals=[1,5,15], a=1, b=3, N=100000):
+def run_simu_util(n, a=1, b=3, N=100000, seed=None, workers=1):
+    return run_simu_sweep([n], a, b, N, seed=seed, workers=workers)[n]
+
+# Histogram bin edges for the height of a stack of n books
+def stack_bins(n, a, b): return stack_histogram(n, a, b).edges
+def stack_histogram(n, a, b): return Histogram(n*a, n*b, 30)
+
+# Sweep version of run_simu_util for every n in n_vals from one pass of draws: each
+# chunk draws a (rows, max(n_vals)) matrix of book thicknesses, and column n-1 of
+# its cumulative sum along axis 1 is the height of a stack of the first n books.
+# All stack sizes share the same draws, histogram counts are accumulated per n
+# over fixed bins, and chunks may be spread over worker processes.
+# Returns {n : [mean, s_dev, hist, b_edges, bar, w]}
+def run_simu_sweep(n_vals, a=1, b=3, N=100000, chunk_size=2**22, seed=None, workers=1):
+    rows = max(1, chunk_size // max(n_vals))
+    histograms = run_trials(stack_hist_block, N, seed, workers, rows, args=(tuple(n_vals), a, b))
+    b_edges = {n : stack_bins(n, a, b) for n in n_vals}
+
+    # Generate histogram bars, normalized as np.histogram(density=True) would
+    results = {}
+    for n in n_vals:
+        widths = np.diff(b_edges[n])
+        counts = histograms[n].counts
+        hist = counts / (counts.sum() * widths)
+        bar = (b_edges[n][:-1]+b_edges[n][1:]) / 2
+        results[n] = [stack_mean(n, a, b), stack_sdev(n, a, b), hist, b_edges[n], bar, bar[1]-bar[0]]
+    return results
+
+# Stack height histograms for every n over one block of trials
+def stack_hist_block(trials, rng, n_vals, a, b):
+    heights = np.cumsum(rng.uniform(a, b, (trials, max(n_vals))), axis=1)
+    return {n : stack_histogram(n, a, b).add(heights[:, n-1]) for n in n_vals}
+
+# Exact density of the stack height for n books (Irwin-Hall over [a,b]) evaluated
+# at x, and the largest gap between it and the normal approximation at x
+def stack_exact_pdf(x, n, a=1, b=3):
+    grid, density = irwin_hall_pdf(n, a, b)
+    inside = (x >= n*a) & (x <= n*b)
+    return np.where(inside, np.interp(x, grid, density), 0)
+
+def normal_approx_error(n, a=1, b=3, points=1000):
+    x = np.linspace(n*a, n*b, points)
+    mean, s_dev = stack_mean(n, a, b), stack_sdev(n, a, b)
+    normal_vals = pdf(x, mu=mean, var=pow(s_dev,2))
+    return np.max(np.abs(normal_vals - stack_exact_pdf(x, n, a, b)))
+
+def report_book_simu(result):
+    for n, stats in result.stats.items():
+        print("n=" + str(n) + ": max |normal - exact| =", round(stats['normal_error'], 5))
+
+# Run the simulation for each n value, simulate=False compares the
+# normal approximation against the exact density without sampling, and
+# sweep=True draws every stack size from one shared pass. arrays and
+# stats are keyed by n
+@cache_result(report=report_book_simu)
+def run_book_simu(n_vals=[1,5,15], a=1, b=3, N=100000, simulate=True, sweep=False, seed=None, workers=1, 
+    verbose=True):
+    timer = phases("run_book_simu")
     plt_data = []
+    arrays, stats = {}, {}
+    if simulate and sweep:
+        plt_data = run_simu_sweep(n_vals, a, b, N, seed=seed, workers=workers)
+        timer.mark("sampling", N, N*max(n_vals))
     for n in n_vals:
-        mean, s_dev, hist, b_edges, bar, w = run_simu_util(n, a, b, N)
-
-        # Plot results
-        plt.bar(x=bar, height=hist, width=w, edgecolor='w')
-        pdf_vals = [pdf(x, mu=mean, var=pow(s_dev,2)) for x in bar]
-        plt.plot(bar, pdf_vals, 'r')
+        if simulate:
+            if sweep: mean, s_dev, hist, b_edges, bar, w = plt_data[n]
+            else:
+                mean, s_dev, hist, b_edges, bar, w = run_simu_util(n, a, b, N, seed, workers)
+                timer.mark("sampling", N, N*n)
+            arrays[n] = {'hist' : hist, 'b_edges' : b_edges, 'width' : w}
+        else:
+            mean, s_dev = stack_mean(n, a, b), stack_sdev(n, a, b)
+            bar = np.linspace(n*a, n*b, 301)
+            arrays[n] = {}
+
+        # Normal approximation and exact density over the bars
+        arrays[n].update(bar=bar, normal=pdf(bar, mu=mean, var=pow(s_dev,2)), exact=stack_exact_pdf(bar, n, a, b))
+        stats[n] = {'mean' : mean, 's_dev' : s_dev, 'normal_error' : float(normal_approx_error(n, a, b))}
+        timer.mark("statistics")
+
+    result = ExperimentResult("run_book_simu", 
+        params={'n_vals' : list(n_vals), 'a' : a, 'b' : b, 'N' : N, 'simulate' : simulate}, 
+        arrays=arrays, stats=stats)
+    if verbose: report_book_simu(result)
+    timer.mark("output")
+    return result
+
+def plot_book_simu(result):
+    timer = phases("plot_book_simu")
+    plt = pyplot()
+    params = result.params
+    for n, arrays in result.arrays.items():
+        bar = arrays['bar']
+        if 'hist' in arrays: plt.bar(x=bar, height=arrays['hist'], width=arrays['width'], edgecolor='w')
+        plt.plot(bar, arrays['normal'], 'r', label="Normal")
+        plt.plot(bar, arrays['exact'], 'g--', label="Exact (Irwin-Hall)")
         plt.xlabel("Height of Book Stack (cm) for Size n=" + str(n) + " Books")
         plt.ylabel("Probability Density Function")
-        plt.title("Book Stack Height PDF and Normal Distribution Over N=" + str(N) 
-        + " Samples In [" + str(a) + "," + str(b) + "]")
-        plt.show()
+        plt.title("Book Stack Height PDF and Normal Distribution Over N=" + str(params['N']) 
+        + " Samples In [" + str(params['a']) + "," + str(params['b']) + "]")
+        plt.legend()
+        show(plt, timer)
 
-# run_book_simu()
+# plot_book_simu(run_book_simu())
 
 
 '''
@@ -177,50 +256,233 @@ Distribution of the sum of exponential random variables
 '''
 
 # Generate the n values with the given beta in an exponential
-# distribution, representing our "batteries" comprising a "carton"
-def generate_carton(beta, n):
-    return np.random.exponential(beta, n)
+# distribution, representing our "batteries" comprising a "carton".
+# beta may hold one value per battery, size gives a (size, n) matrix
+# of cartons drawn from the generator rng
+def generate_carton(beta, n, size=None, rng=np.random):
+    if size is None: return rng.exponential(beta, n)
+    return rng.exponential(np.broadcast_to(beta, (n,)), (size, n))
+
+# Lifetimes C of N cartons. With identical batteries C is a sum of n iid exponentials,
+# which is exactly Gamma(n, beta), so method='gamma' draws C directly. method='sum'
+# sums an (rows, n) exponential matrix along axis 1, this is also used when beta is
+# an array holding a different beta for each of the n batteries. Cartons are drawn
+# in chunks that may be spread over worker processes
+def carton_lifetimes(beta=45, n=24, N=10000, method='gamma', chunk_size=2**22, seed=None, workers=1):
+    betas = np.asarray(beta, dtype=np.float64)
+    if betas.ndim and betas.shape != (n,):
+        raise ValueError("Expected one beta per battery, got " + str(betas.size) + " for n=" + str(n))
+    rows = max(1, chunk_size // n)
+    return np.concatenate(run_trials(carton_block, N, seed, workers, rows, args=(beta, n, method)))
+
+# Lifetimes of one block of cartons, as a list so partial results concatenate
+def carton_block(trials, rng, beta, n, method):
+    betas = np.asarray(beta, dtype=np.float64)
+    if betas.ndim == 0 and method == 'gamma': return [rng.gamma(n, beta, trials)]
+    return [generate_carton(betas, n, trials, rng).sum(axis=1)]
+
+# Random variates drawn per carton: one gamma draw, or one exponential per battery
+def carton_draws(beta, n, method):
+    return 1 if np.ndim(beta) == 0 and method == 'gamma' else n
+
+# Constant memory summary of the lifetimes of N cartons: their moments, range, a
+# quantile sketch and a histogram of bins fine bins over [0, mean + 12 s_dev] (the
+# rare lifetime past it is only counted as overflow). Chunks are summarized where
+# they are drawn and merged, so memory does not grow with N
+def carton_summary(beta=45, n=24, N=10000, method='gamma', chunk_size=2**22, seed=None, workers=1, bins=4096):
+    rows = max(1, chunk_size // n)
+    return run_trials(carton_summary_block, N, seed, workers, rows, args=(beta, n, method, bins))
+
+def carton_summary_block(trials, rng, beta, n, method, bins=4096):
+    C_vals = carton_block(trials, rng, beta, n, method)[0]
+    mean, s_dev = carton_mean_sdev(beta, n)
+    return {'moments' : Moments().add(C_vals), 'range' : MinMax().add(C_vals), 
+        'hist' : Histogram(0, mean + 12*s_dev, bins).add(C_vals), 'sketch' : QuantileSketch().add(C_vals)}
+
+# Central Limit: mean and s_dev of the carton lifetime, each battery
+# contributes its beta to the mean and beta^2 to the variance
+def carton_mean_sdev(beta, n):
+    betas = np.broadcast_to(np.asarray(beta, dtype=np.float64), (n,))
+    return float(betas.sum()), float(sqrt(np.sum(betas**2)))
+
+# Summary of carton lifetimes over several (beta, n) configurations, beta may be a
+# scalar or per-battery array. Returns a list of [beta, n, mean, s_dev, min, max]
+def carton_sweep(configs, N=10000, method='gamma', seed=None, workers=1):
+    configs = list(configs)
+    seeds = seed_sequence(seed).spawn(len(configs))
+    summary = []
+    for (beta, n), config_seed in zip(configs, seeds):
+        stats = carton_summary(beta, n, N, method, seed=config_seed, workers=workers)
+        moments, lifetime_range = stats['moments'], stats['range']
+        summary.append([beta, n, moments.mean, moments.std, lifetime_range.min, lifetime_range.max])
+    return summary
 
-def run_carton_simu(beta=45, n=24, N=10000):
-    # Run N simulations of cartons, track lifetime sum C
-    C_vals = []
-    for _ in range(N): C_vals.append(sum(generate_carton(beta, n)))
+'''
+Tail probabilities by importance sampling
+-----------------------------------------
+P(C <= t) far below the mean lifetime (or P(C > t) far above it) is rarely hit by
+plain simulation. Exponential tilting by theta turns each battery with mean beta
+into an exponential with mean beta/(1 - theta*beta), so cartons are drawn with
+generate_carton from the tilted betas and every carton is weighted by the
+likelihood ratio L = exp(-theta*C) / prod(1 - theta*beta). Choosing theta so the
+tilted mean lifetime is t puts about half of the draws in the tail while the
+weighted average stays an unbiased estimate of the tail probability
+'''
+# Tilting parameter theta making the tilted mean lifetime sum(beta/(1 - theta*beta))
+# equal t. Closed form for identical batteries, bisection when beta is per battery
+def carton_tilt(beta, n, t):
+    betas = np.broadcast_to(np.asarray(beta, dtype=np.float64), (n,))
+    if np.all(betas == betas[0]): return 1/betas[0] - n/t
+    tilted_mean = lambda theta: np.sum(betas / (1 - theta*betas))
+    low, high = -1/betas.max(), 1/betas.max()
+    while tilted_mean(low) > t: low *= 2
+    for _ in range(200):
+        mid = (low + high) / 2
+        if tilted_mean(mid) > t: high = mid
+        else: low = mid
+    return low
+
+# Weighted tail sums over one block of tilted cartons, summed across blocks:
+# [tail hits, sum of w, sum of w^2, sum of L, sum of L^2] where w = L on the tail
+def carton_tail_block(trials, rng, beta, n, t, theta, tail, method):
+    betas = np.asarray(beta, dtype=np.float64)
+    C_vals = carton_block(trials, rng, betas / (1 - theta*betas), n, method)[0]
+    ratios = np.exp(-theta*C_vals - np.sum(np.log1p(-theta*np.broadcast_to(betas, (n,)))))
+    weights = np.where(C_vals <= t if tail == 'left' else C_vals > t, ratios, 0)
+    return np.array([np.count_nonzero(weights), weights.sum(), np.square(weights).sum(), 
+        ratios.sum(), np.square(ratios).sum()])
+
+# Estimate P(C <= t) (tail='left') or P(C > t) (tail='right') from N tilted cartons.
+# The tilt is only applied when t lies in the requested tail, tilt=False gives plain
+# simulation for comparison. Reports the estimator variance, relative error, the
+# effective sample size of the likelihood ratios and the variance reduction over
+# plain simulation, with the exact gamma value when all batteries share one beta
+@cache_result
+def carton_tail_prob(t, beta=45, n=24, N=100000, tail='left', tilt=True, method='gamma', 
+    chunk_size=2**22, seed=None, workers=1):
+    if tail not in ('left', 'right'): raise ValueError("tail must be 'left' or 'right', got " + str(tail))
+    mean, _ = carton_mean_sdev(beta, n)
+    in_tail = t < mean if tail == 'left' else t > mean
+    theta = carton_tilt(beta, n, t) if tilt and in_tail else 0.0
+
+    timer = phases("carton_tail_prob")
+    rows = max(1, chunk_size // n)
+    hits, w_sum, w_sq_sum, L_sum, L_sq_sum = run_trials(carton_tail_block, N, seed, workers, rows, 
+        args=(beta, n, t, theta, tail, method))
+    timer.mark("sampling", N, N*carton_draws(beta, n, method))
+
+    # Variance of the weighted indicator and of the estimator, its mean over N cartons
+    p = float(w_sum / N)
+    sample_var = max(w_sq_sum - N*p*p, 0) / (N-1) if N > 1 else float('inf')
+    std_error = sqrt(sample_var / N)
+    exact = {}
+    if np.ndim(beta) == 0: exact['tail'] = float(gammainc(n, t/beta) if tail == 'left' else gammaincc(n, t/beta))
+    timer.mark("statistics")
+
+    return ExperimentResult("carton_tail_prob", 
+        params={'t' : t, 'beta' : beta, 'n' : n, 'N' : N, 'tail' : tail, 'theta' : theta},
+        counts={'tail' : int(hits)}, probabilities={'tail' : p}, exact=exact,
+        stats={'variance' : sample_var / N, 'std_error' : std_error, 
+            'relative_error' : std_error / p if p > 0 else float('inf'),
+            'ess' : L_sum**2 / L_sq_sum if L_sq_sum > 0 else 0.0,
+            'variance_reduction' : p*(1-p) / sample_var if sample_var > 0 else float('inf')})
+
+# Compare plain simulation against importance sampling for P(C <= t) at each t
+def run_carton_tails(t_vals=(730, 912, 1095), beta=45, n=24, N=100000, tail='left', seed=None, workers=1):
+    seeds = seed_sequence(seed).spawn(2*len(t_vals))
+    results = []
+    print("Carton Lifetime Tail Probabilities P(C " + ("<=" if tail == 'left' else ">") + " t), N=" + str(N) 
+        + "\n--------------------------------------------------")
+    for i, t in enumerate(t_vals):
+        plain = carton_tail_prob(t, beta, n, N, tail, tilt=False, seed=seeds[2*i], workers=workers)
+        tilted = carton_tail_prob(t, beta, n, N, tail, tilt=True, seed=seeds[2*i+1], workers=workers)
+        print("   t=" + str(t) + ": exact " + format(tilted.exact.get('tail', float('nan')), ".6g"))
+        for name, result in [("Plain     ", plain), ("Importance", tilted)]:
+            print("      " + name + " " + format(result.probabilities['tail'], ".6g") 
+                + "  rel. error " + format(result.stats['relative_error'], ".3g") 
+                + "  ESS " + format(round(result.stats['ess']), ",")
+                + "  variance reduction " + format(result.stats['variance_reduction'], ".3g"))
+        results.append(tilted)
+    return results
+
+# run_carton_tails()
+
+# Lifetime quantiles reported by run_carton_simu, estimated to within 1%
+CARTON_QUANTILES = (0.01, 0.05, 0.5, 0.95, 0.99)
+
+# Number of cartons drawn and why an adaptive run stopped, nothing for a fixed N
+def report_carton_simu(result):
+    stats = result.stats
+    if 'stopped' in stats: print("Cartons simulated:", stats['trials_used'], "(stopped on " + stats['stopped'] 
+        + ", interval half-width:", str(round(stats['precision'], 6)) + ")")
+
+# With a tolerance (or time_budget in seconds) N becomes a budget: cartons are drawn
+# in batches until the confidence interval half-width of the mean lifetime (relative
+# to the mean with relative=True) is within tolerance
+@cache_result(report=report_carton_simu)
+def run_carton_simu(beta=45, n=24, N=10000, method='gamma', seed=None, workers=1, verbose=True, 
+    tolerance=None, time_budget=None, relative=False, confidence=0.95):
+    # Run N simulations of cartons, summarizing the lifetime sums C as they are drawn
+    timer = phases("run_carton_simu")
+    adaptive = None
+    if tolerance is not None or time_budget is not None:
+        adaptive = run_adaptive(carton_summary_block, N, 
+            lambda summary, trials: mean_precision(summary['moments'], confidence, relative), 
+            tolerance, time_budget, seed, max_batch=max(1, 2**22 // n), args=(beta, n, method))
+        summary = adaptive.total
+    else: summary = carton_summary(beta, n, N, method, seed=seed, workers=workers)
+    moments, lifetime_range = summary['moments'], summary['range']
+    trials = adaptive.trials if adaptive else N
+    timer.mark("sampling", trials, trials*carton_draws(beta, n, method))
 
     # Central Limit: Calculate mean and s_dev for gaussian plot
-    mean = n * beta
-    s_dev = beta * sqrt(n)
-
-    # Find the min and max values for bins
-    min_val = float('inf')
-    max_val = float('-inf')
-    for c_val in C_vals:
-        if c_val < min_val: min_val = c_val
-        if c_val > max_val: max_val = c_val
-    min_val = floor(min_val-1)
-    max_val = ceil(max_val+1)
-    print(min_val)
+    mean, s_dev = carton_mean_sdev(beta, n)
+
+    # PDF of carton lifetime f(c) from the fine histogram grouped into about 50 bins,
+    # with the normal distribution for the calculated mean and s_dev, and the
+    # cumulative distribution function
+    counts, b_edges = summary['hist'].coarsen(49)
+    hist = counts / (counts.sum() * np.diff(b_edges))
+    bar = (b_edges[:-1]+b_edges[1:]) / 2
+    norm_vals = pdf(bar, mu=mean, var=pow(s_dev,2))
+    cdf = np.cumsum(counts) / counts.sum()
+    quantiles = dict(zip(CARTON_QUANTILES, summary['sketch'].quantile(CARTON_QUANTILES).tolist()))
+    timer.mark("statistics")
+
+    result = ExperimentResult("run_carton_simu", params={'beta' : beta, 'n' : n, 'N' : N, 'method' : method}, 
+        arrays={'hist' : hist, 'b_edges' : b_edges, 'bar' : bar, 'normal' : norm_vals, 'cdf' : cdf},
+        stats={'mean' : mean, 's_dev' : s_dev, 'sample_mean' : moments.mean, 'sample_sdev' : moments.std, 
+            'min' : lifetime_range.min, 'max' : lifetime_range.max, 
+            'quantiles' : quantiles,
+            **(adaptive.stats() if adaptive else {})})
+    if verbose: report_carton_simu(result)
+    timer.mark("output")
+    return result
+
+def plot_carton_simu(result):
+    timer = phases("plot_carton_simu")
+    plt = pyplot()
+    arrays, n = result.arrays, result.params['n']
+    bar = arrays['bar']
 
     # Plot PDF of carton lifetime f(c)
     plt.subplot(1,2,1)
-    hist, b_edges = np.histogram(C_vals, bins=np.linspace(min_val, max_val), density=True)
-    bar = (b_edges[:-1]+b_edges[1:]) / 2
-    w = bar[1]-bar[0]
-    plt.bar(x=bar, height=hist, width=w, edgecolor='w')
+    plt.bar(x=bar, height=arrays['hist'], width=np.diff(arrays['b_edges']), edgecolor='w')
 
     # Plot normal distribution with calculated mean and s_dev
-    norm_vals = [pdf(x, mu=mean, var=pow(s_dev,2)) for x in bar]
-    plt.plot(bar, norm_vals, 'r')
+    plt.plot(bar, arrays['normal'], 'r')
     plt.xlabel("Lifetime of Carton of n=" + str(n) + " Batteries (days)")
     plt.ylabel("Probability Density Function")
     plt.title("Battery Carton Lifetime PDF f(x) and Normal Distribution")
 
     # Plot cumulative distribution function
     plt.subplot(1,2,2)
-    cdf = np.cumsum(hist*w)
-    plt.plot(np.linspace(min_val, max_val, len(cdf)), cdf)
+    b_edges = arrays['b_edges']
+    plt.plot(np.linspace(b_edges[0], b_edges[-1], len(arrays['cdf'])), arrays['cdf'])
     plt.xlabel("Lifetime of Carton of n=" + str(n) + " Batteries (days)")
     plt.ylabel("Cumulative Distribution Function F(x)")
     plt.title("Battery Carton Lifetime CDF F(x)")
-    plt.show()
+    show(plt, timer)
 
-run_carton_simu()
\ No newline at end of file
+if __name__ == "__main__":
+    plot_carton_simu(run_carton_simu())
@@ -1,13 +1,22 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import random
-import math
+import os
+import sys
 
-# Run a nCr calculation
+# Shared helpers live in probtools/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probtools import AliasSampler, ExperimentResult, dice_sum_pmf, pyplot, run_trials
+from probtools.combinatorics import ncr
+from probtools.adaptive import run_adaptive, proportion_precision
+from probtools.cache import cache_result
+from probtools.profiling import phases
+from probtools.render import show
+
+# Run a nCr calculation, exact for any n
 def combinations(n, r):
-    return int(math.factorial(n) / (math.factorial(r) * math.factorial(n-r)))
+    return ncr(n, r)
 
-def four_kind():
+def four_kind(verbose=True):
     # The number of possible ways to draw 6 cards
     num_hands = combinations(52, 6)
     
@@ -25,117 +34,238 @@ def four_kind():
     probability = round(four_kind_hands / num_hands, 6)
 
     # Output results
-    print("Results\n-------")
-    print("   Number of possible four-of-a-kind hands:", four_kind_hands)
-    print("   Total number of possible hands:", num_hands)
-    print("   Probability of drawing a four-of-a-kind hand:", probability)
-
-four_kind()
-
-
-def exact_tosses(N=100000, target_freq=35):
-    exact_count = 0
-    heads_reached = []
-    # Perform N experiments in which 100 coin flips are simulated in each
-    for _ in range(N):
-        num_heads = 0
-        # Perform "coin flips" where a value of False represents tails
-        for _ in range(100):
-            # Let a boolean True value represent "heads" as result of flip 
-            if random.choice([True, False]): num_heads += 1
-        heads_reached.append(num_heads)
-
-        # Trial of experiment yielded exactly the correct number of heads
-        # log the count, before advancing to next trial
-        if num_heads == target_freq: exact_count += 1
-        
-    # Calculate and output coin flip data
+    if verbose:
+        print("Results\n-------")
+        print("   Number of possible four-of-a-kind hands:", four_kind_hands)
+        print("   Total number of possible hands:", num_hands)
+        print("   Probability of drawing a four-of-a-kind hand:", probability)
+
+    return ExperimentResult("four_kind", 
+        counts={'four_kind_hands' : four_kind_hands, 'hands' : num_hands},
+        exact={'four_kind' : four_kind_hands / num_hands})
+
+# four_kind()
+
+
+# Number of heads in each of N experiments of flips coin tosses, drawn directly from
+# the binomial distribution chunk_size experiments at a time and tallied into a
+# fixed [0:flips] count array, so memory stays constant however large N gets.
+# Chunks may be spread over worker processes
+def binomial_head_counts(N, flips=100, chunk_size=10000000, seed=None, workers=1):
+    return run_trials(head_count_block, N, seed, workers, chunk_size, args=(flips,))
+
+def head_count_block(trials, rng, flips):
+    return np.bincount(rng.binomial(flips, 0.5, size=trials), minlength=flips+1)
+
+# Output coin flip data
+def report_exact_tosses(result):
+    N, target_freq, exact_count = result.params['N'], result.params['target_freq'], result.counts['exact']
     print("Results\n-------")
     print("Target Number of Heads:", target_freq)
-    print("   Average Number of Heads:", round(sum(heads_reached) / N, 3))
+    if 'stopped' in result.stats: print("   Experiments run:", N, "(stopped on " + result.stats['stopped'] 
+        + ", interval half-width:", str(round(result.stats['precision'], 6)) + ")")
+    print("   Average Number of Heads:", round(result.stats['mean'], 3))
     print("   Number of trials with exactly", target_freq, "heads:", exact_count)
     print("   Probability of getting exactly", target_freq, "heads:", round(exact_count/N, 4))
 
-    # Create histogram
-    plt.hist(heads_reached)
-    plt.title("Number of Heads Achieved in 100,000 Trials of 100 Coin Flips")
+# With a tolerance (or time_budget in seconds) N becomes a budget: experiments are
+# run in batches until the confidence interval half-width of the probability of
+# exactly target_freq heads (relative to it with relative=True) is within tolerance
+@cache_result(when=lambda p: p['vectorized'] or p['tolerance'] is not None, report=report_exact_tosses)
+def exact_tosses(N=100000, target_freq=35, flips=100, vectorized=False, chunk_size=10000000, 
+    seed=None, workers=1, verbose=True, tolerance=None, time_budget=None, relative=False, confidence=0.95):
+    # Maps the number of heads reached to the number of experiments reaching it
+    timer = phases("exact_tosses")
+    adaptive = None
+    if tolerance is not None or time_budget is not None:
+        reachable = 0 <= target_freq <= flips
+        adaptive = run_adaptive(head_count_block, N, 
+            lambda counts, n: proportion_precision(counts[target_freq] if reachable else 0, n, confidence, relative), 
+            tolerance, time_budget, seed, max_batch=chunk_size, args=(flips,))
+        head_counts, N = adaptive.total, adaptive.trials
+    elif vectorized:
+        head_counts = binomial_head_counts(N, flips, chunk_size, seed, workers)
+    else:
+        head_counts = np.zeros(flips+1, dtype=np.int64)
+        # Perform N experiments in which flips coin flips are simulated in each
+        for _ in range(N):
+            num_heads = 0
+            # Perform "coin flips" where a value of False represents tails
+            for _ in range(flips):
+                # Let a boolean True value represent "heads" as result of flip 
+                if random.choice([True, False]): num_heads += 1
+            head_counts[num_heads] += 1
+    timer.mark("sampling", N, N if vectorized or adaptive else N*flips)
+
+    # Trials of experiment yielding exactly the correct number of heads
+    exact_count = int(head_counts[target_freq]) if 0 <= target_freq <= flips else 0
+    avg_heads = np.dot(np.arange(flips+1), head_counts) / N
+    timer.mark("aggregation")
+
+    result = ExperimentResult("exact_tosses", 
+        params={'N' : N, 'target_freq' : target_freq, 'flips' : flips},
+        counts={'exact' : exact_count}, probabilities={'exact' : exact_count/N},
+        arrays={'head_counts' : head_counts}, stats=dict(mean=float(avg_heads), **(adaptive.stats() if adaptive else {})))
+    if verbose: report_exact_tosses(result)
+    timer.mark("output")
+    return result
+
+# Histogram over the range of head counts reached
+def plot_exact_tosses(result):
+    timer = phases("plot_exact_tosses")
+    plt = pyplot()
+    params, head_counts = result.params, result.arrays['head_counts']
+    reached = np.flatnonzero(head_counts)
+    plt.hist(np.arange(head_counts.size), weights=head_counts, range=(reached[0], reached[-1]))
+    plt.title("Number of Heads Achieved in " + format(params['N'], ",") + " Trials of " + str(params['flips']) + " Coin Flips")
     plt.xlabel("Number of Heads")
     plt.ylabel("Number of Occurrences")
-    plt.show()
-
-# exact_tosses()
-
-def unfair_die(N=10000):
-    # Maps the die value to the amount of times that it 
-    # should appear (out of 100) from the given probabilities
-    occurences = {
-        1 : 10,
-        2 : 15,
-        3 : 30,
-        4 : 25,
-        5 : 5,
-        6 : 15 
-    }
-
-    # Populate the die with 100 options proportional to
-    # the probability of each die value occurring
-    die = []
-    for die_val, die_freq in occurences.items():
-        # For each die value, it should appear die_freq 
-        # amount of times out of 100 possible total
-        for _ in range(die_freq): die.append(die_val)
-
-    # Randomize our "die" to equally distribute values
-    for _ in range(10000): random.shuffle(die)
-
-    # Perform N "rolls" by randomly selecting a value on
-    # the die, log the result of each roll
-    roll_vals = []
-    for _ in range(N): roll_vals.append(die[random.randint(0, 99)]) 
-
-    # Create stem plot
-    hist, bin_edges = np.histogram(np.asarray(roll_vals), bins=range(1,8))
-    plt.stem(bin_edges[0:6], hist)
-    plt.title("Stem Plot - 10,000 Rolls of A Unfair Die")
+    show(plt, timer)
+
+# plot_exact_tosses(exact_tosses())
+# plot_exact_tosses(exact_tosses(N=1000000000, vectorized=True))
+
+@cache_result
+def unfair_die(N=10000, probabilities=None, seed=None):
+    # Maps the die value to the probability of rolling it,
+    # weights need not sum to 1 or be whole percentages
+    timer = phases("unfair_die")
+    if probabilities is None:
+        probabilities = {
+            1 : 0.10,
+            2 : 0.15,
+            3 : 0.30,
+            4 : 0.25,
+            5 : 0.05,
+            6 : 0.15 
+        }
+    faces = list(probabilities.keys())
+    die = AliasSampler(list(probabilities.values()))
+    timer.mark("population")
+
+    # Perform N "rolls" of the die at once, each roll is the
+    # index of the face rolled, then count the rolls per face
+    rolls = die.sample(N, np.random.default_rng(seed))
+    timer.mark("sampling", N, 2*N)
+    roll_counts = np.bincount(rolls, minlength=len(faces))
+    timer.mark("aggregation")
+
+    return ExperimentResult("unfair_die", params={'N' : N}, 
+        probabilities={face : count/N for face, count in zip(faces, roll_counts.tolist())},
+        arrays={'faces' : np.asarray(faces), 'roll_counts' : roll_counts})
+
+# Stem plot of the number of rolls of each face
+def plot_unfair_die(result):
+    timer = phases("plot_unfair_die")
+    plt = pyplot()
+    plt.stem(result.arrays['faces'], result.arrays['roll_counts'])
+    plt.title("Stem Plot - " + format(result.params['N'], ",") + " Rolls of A Unfair Die")
     plt.xlabel("Value of Roll")
     plt.ylabel("Frequency")
-    plt.show()
-
-# unfair_die()
-
-def rolls_to_target(N=100000, target_val=7):
-    num_rolls_needed = []
-    # Perform N trials
-    for _ in range(N):
-        roll_count = 0
-        while True:
-            # Perform "roll" of two dice, track the roll count
-            roll_val = random.randint(1, 6) + random.randint(1, 6)
-            roll_count += 1
-
-            # Number of rolls exceeded, discard 
-            if roll_count > 60: break 
-
-            # Target value reached, save the amount of rolls required
-            if roll_val == 7:
-                num_rolls_needed.append(roll_count)
-                break
-
-    # Calculate and output roll data
-    avg_rolls = round(sum(num_rolls_needed) / N, 3)
-    min_roll = min(num_rolls_needed)
-    max_roll = max(num_rolls_needed)
+    show(plt, timer)
+
+# plot_unfair_die(unfair_die())
+
+# Probability that a single roll of two dice sums to target_val
+def two_dice_prob(target_val, sides=6):
+    sums, probs = dice_sum_pmf(2, sides)
+    if target_val < sums[0] or target_val > sums[-1]: return 0.0
+    return float(probs[target_val - sums[0]])
+
+# Success probability of each roll, for a target two dice can roll
+def target_prob(target_val):
+    p = two_dice_prob(target_val)
+    if p == 0: raise ValueError("Target value " + str(target_val) + " cannot be rolled with two dice")
+    return p
+
+# The number of rolls until the target is first reached is geometric with
+# success probability two_dice_prob, so a whole chunk of trials is drawn in one
+# call. Trials needing more than max_rolls rolls are discarded as in the loop
+# version, the rest are tallied into a [0:max_rolls] count array
+def geometric_roll_counts(N, target_val=7, max_rolls=60, chunk_size=10000000, seed=None, workers=1):
+    p = target_prob(target_val)
+    return run_trials(roll_count_block, N, seed, workers, chunk_size, args=(p, max_rolls))
+
+# Mean number of rolls over the kept trials, those reaching the target within
+# max_rolls: E[X | X <= m] = 1/p - m q^m / (1 - q^m) for X geometric, q = 1-p
+def truncated_geometric_mean(p, max_rolls):
+    q_m = (1-p)**max_rolls
+    return 1/p - max_rolls * q_m / (1 - q_m)
+
+def roll_count_block(trials, rng, p, max_rolls):
+    rolls = rng.geometric(p, size=trials)
+    return np.bincount(rolls[rolls <= max_rolls], minlength=max_rolls+1)
+
+# Output roll data
+def report_rolls_to_target(result):
+    params, stats = result.params, result.stats
     print("Results\n-------")
-    print("Target value:", target_val)
-    print("   Average rolls required:", avg_rolls)
-    print("   Minimum number of rolls:", min_roll)
-    print("   Maximum number of rolls:", max_roll)
-    
-    # Create histogram
-    plt.hist(np.asarray(num_rolls_needed), bins=range(1,max_roll))    
-    plt.title("Number of Dice Rolls to Reach Value 7")
+    print("Target value:", params['target_val'])
+    print("   Average rolls required:", stats['mean'])
+    print("   Minimum number of rolls:", stats['min'])
+    print("   Maximum number of rolls:", stats['max'])
+    print("   Trials discarded after", params['max_rolls'], "rolls:", params['N'] - stats['kept'])
+
+@cache_result(when=lambda p: p['vectorized'], report=report_rolls_to_target)
+def rolls_to_target(N=100000, target_val=7, max_rolls=60, vectorized=False, seed=None, workers=1, verbose=True):
+    # Maps the number of rolls needed to the number of trials needing it
+    timer = phases("rolls_to_target")
+    p = target_prob(target_val)
+    if vectorized:
+        roll_counts = geometric_roll_counts(N, target_val, max_rolls, seed=seed, workers=workers)
+    else:
+        roll_counts = np.zeros(max_rolls+1, dtype=np.int64)
+        # Perform N trials
+        for _ in range(N):
+            roll_count = 0
+            while True:
+                # Perform "roll" of two dice, track the roll count
+                roll_val = random.randint(1, 6) + random.randint(1, 6)
+                roll_count += 1
+
+                # Number of rolls exceeded, discard 
+                if roll_count > max_rolls: break 
+
+                # Target value reached, count the amount of rolls required
+                if roll_val == target_val:
+                    roll_counts[roll_count] += 1
+                    break
+
+    # Each trial rolls two dice until the target, discarded trials rolled max_rolls+1 times
+    rolls_made = np.dot(np.arange(max_rolls+1), roll_counts) + (N - roll_counts.sum()) * (max_rolls+1)
+    timer.mark("sampling", N, N if vectorized else 2*rolls_made)
+
+    # Calculate roll data, there is none when every trial was discarded
+    kept = int(roll_counts.sum())
+    reached = np.flatnonzero(roll_counts)
+    avg_rolls, min_roll, max_roll = float('nan'), None, None
+    if kept:
+        avg_rolls = round(np.dot(np.arange(max_rolls+1), roll_counts) / kept, 3)
+        min_roll = int(reached[0])
+        max_roll = int(reached[-1])
+    timer.mark("statistics")
+
+    result = ExperimentResult("rolls_to_target", 
+        params={'N' : N, 'target_val' : target_val, 'max_rolls' : max_rolls},
+        exact={'mean' : truncated_geometric_mean(p, max_rolls)}, arrays={'roll_counts' : roll_counts},
+        stats={'mean' : float(avg_rolls), 'min' : min_roll, 'max' : max_roll, 'kept' : kept})
+    if verbose: report_rolls_to_target(result)
+    timer.mark("output")
+    return result
+
+# Histogram of the number of rolls needed
+def plot_rolls_to_target(result):
+    timer = phases("plot_rolls_to_target")
+    plt = pyplot()
+    roll_counts = result.arrays['roll_counts']
+    plt.hist(np.arange(roll_counts.size), bins=range(1,(result.stats['max'] or 0)+2), weights=roll_counts)    
+    plt.title("Number of Dice Rolls to Reach Value " + str(result.params['target_val']))
     plt.xlabel("Number of Rolls")
     plt.ylabel("Number of Occurrences")
-    plt.show()
+    show(plt, timer)
+
+# plot_rolls_to_target(rolls_to_target())
+# plot_rolls_to_target(rolls_to_target(N=1000000, vectorized=True))
 
-# rolls_to_target()
+if __name__ == "__main__":
+    four_kind()
@@ -0,0 +1,35 @@
+# ------------------------------------------------------------
+# Shared helpers used by the experiment scripts in each folder
+# ------------------------------------------------------------
+import importlib
+
+# Public names by the submodule defining them. Submodules are imported on first
+# use, so importing probtools (or one of its helpers) does not pull in scipy
+# and every other dependency of the package
+_EXPORTS = {
+    'sampling' : ['AliasSampler'],
+    'population' : ['Population'],
+    'combinatorics' : ['ncr', 'log_ncr', 'ncr_array', 'log_ncr_array'],
+    'convolution' : ['sum_pmf', 'dice_sum_pmf', 'irwin_hall_pdf'],
+    'quantiles' : ['z_score', 't_score', 'z_scores', 't_scores', 'z_interval', 't_interval'],
+    'popstore' : ['make_population', 'load_population'],
+    'runner' : ['run_trials', 'merge_results', 'seed_sequence'],
+    'results' : ['ExperimentResult'],
+    'render' : ['pyplot'],
+    'adaptive' : ['run_adaptive', 'wilson_interval'],
+    'accumulators' : ['Moments', 'MinMax', 'Histogram', 'QuantileSketch'],
+    'cache' : ['cache_result', 'cache_stats', 'clear_cache'],
+    'profiling' : ['phases', 'enable_profiling', 'disable_profiling', 'profiling'],
+}
+_MODULES = {name : module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULES)
+
+def __getattr__(name):
+    if name not in _MODULES: raise AttributeError("module 'probtools' has no attribute " + repr(name))
+    value = getattr(importlib.import_module("probtools." + _MODULES[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
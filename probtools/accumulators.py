@@ -0,0 +1,148 @@
+from math import ceil, log
+import numpy as np
+
+'''
+Streaming accumulators
+----------------------
+Constant memory summaries of simulation outputs. Values are added one NumPy batch
+at a time with add(), and merge() combines two accumulators built from different
+chunks or worker processes into the summary of all their values, so the runner's
+merge_results can reduce them like count arrays. add() and merge() update in place
+and return the accumulator
+'''
+# Count, mean and variance. Each batch is reduced with NumPy and folded in with
+# the pairwise update of Chan et al., the batched form of Welford's algorithm
+class Moments:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0: return self
+        batch = Moments()
+        batch.count = values.size
+        batch.mean = float(values.mean())
+        batch.m2 = float(np.square(values - batch.mean).sum())
+        return self.merge(batch)
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count == 0: return self
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta*delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        return self
+
+    # Sample variance and standard deviation (ddof=1)
+    @property
+    def variance(self): return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+    @property
+    def std(self): return self.variance ** 0.5
+
+class MinMax:
+    def __init__(self):
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def add(self, values):
+        values = np.asarray(values)
+        if values.size:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+        return self
+
+    def merge(self, other):
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+# Counts over bins equal width bins spanning [low, high], binned as np.histogram
+# does (the last bin includes high). Values outside the range are only counted
+# in underflow and overflow
+class Histogram:
+    def __init__(self, low, high, bins):
+        self.low, self.high, self.bins = float(low), float(high), int(bins)
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    @property
+    def edges(self): return np.linspace(self.low, self.high, self.bins+1)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        inside = (values >= self.low) & (values <= self.high)
+        index = ((values[inside] - self.low) * (self.bins / (self.high - self.low))).astype(np.int64)
+        self.counts += np.bincount(np.minimum(index, self.bins-1), minlength=self.bins)
+        self.underflow += int(np.count_nonzero(values < self.low))
+        self.overflow += int(np.count_nonzero(values > self.high))
+        return self
+
+    def merge(self, other):
+        if (self.low, self.high, self.bins) != (other.low, other.high, other.bins):
+            raise ValueError("Cannot merge histograms over different bins")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    # Counts and edges with the empty bins at either end dropped and neighboring
+    # bins grouped so at most bins remain, for plotting a fine histogram coarsely
+    def coarsen(self, bins):
+        used = np.flatnonzero(self.counts)
+        if used.size == 0: return self.counts[:0], self.edges[:1]
+        first, last = used[0], used[-1] + 1
+        group = max(1, ceil((last - first) / bins))
+        starts = np.arange(first, last, group)
+        counts = np.add.reduceat(self.counts, starts)
+        counts[-1] = self.counts[starts[-1]:last].sum()
+        return counts, self.edges[np.append(starts, last)]
+
+# Quantiles to within a relative error, as in DDSketch: a value x > 0 lands in the
+# bucket ceil(log(x) / log(gamma)) with gamma = (1 + accuracy) / (1 - accuracy),
+# negative values in the matching bucket of -x, zeros in their own count. Buckets
+# depend only on the value, so merging adds bucket counts and is exact
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.positive, self.negative = {}, {}
+        self.zeros = 0
+        self.count = 0
+
+    def _add_buckets(self, store, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / log(self.gamma)).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+        self.zeros += int(np.count_nonzero(values == 0))
+        self.count += values.size
+        return self
+
+    def merge(self, other):
+        if self.gamma != other.gamma: raise ValueError("Cannot merge sketches of different accuracy")
+        for store, other_store in [(self.positive, other.positive), (self.negative, other.negative)]:
+            for key, count in other_store.items(): store[key] = store.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    # Value at quantile q in [0, 1], or an array of them for an array of q
+    def quantile(self, q):
+        if self.count == 0: raise ValueError("Quantile of an empty sketch")
+        neg_keys = sorted(self.negative, reverse=True)
+        pos_keys = sorted(self.positive)
+        bucket_value = lambda key: 2 * self.gamma**key / (self.gamma + 1)
+        values = np.array([-bucket_value(k) for k in neg_keys] + [0.0] + [bucket_value(k) for k in pos_keys])
+        counts = np.array([self.negative[k] for k in neg_keys] + [self.zeros] + [self.positive[k] for k in pos_keys])
+        ranks = np.asarray(q, dtype=np.float64) * (self.count - 1)
+        found = values[np.searchsorted(np.cumsum(counts), ranks, side='right')]
+        return float(found) if found.ndim == 0 else found
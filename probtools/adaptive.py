@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+import time
+import numpy as np
+
+from probtools.quantiles import z_score, z_interval
+from probtools.runner import merge_results, seed_sequence
+
+'''
+Precision-targeted stopping
+---------------------------
+Instead of spending a fixed trial budget, trials are run in batches and a running
+confidence interval is checked after each one. The run stops once its half-width
+(or its half-width relative to the estimate) is within tolerance, once the time
+budget is spent, or once the budget of trials is exhausted. Batches start at
+first_batch trials and double up to max_batch, so early checks are cheap and late
+ones are rare. Batch i draws from the i-th child of the seed, so for a given seed
+the stopping point and the estimate are reproducible
+'''
+@dataclass
+class AdaptiveRun:
+    total: object
+    trials: int
+    precision: float
+    stopped: str
+
+    # Summary for an ExperimentResult's stats
+    def stats(self):
+        return {'trials_used' : self.trials, 'precision' : self.precision, 'stopped' : self.stopped}
+
+# Wilson score interval for successes out of trials, successes may be an array.
+# Unlike the normal approximation it stays inside [0, 1] and has a nonzero
+# width when no successes (or only successes) have been seen yet
+def wilson_interval(successes, trials, confidence=0.95):
+    z = z_score(confidence)
+    p = np.asarray(successes, dtype=np.float64) / trials
+    denom = 1 + z*z/trials
+    center = (p + z*z/(2*trials)) / denom
+    half_width = z * np.sqrt(p*(1-p)/trials + z*z/(4*trials*trials)) / denom
+    return center - half_width, center + half_width
+
+# Largest Wilson half-width over the success counts, relative=True divides each by
+# its estimated probability (infinite while no successes have been seen)
+def proportion_precision(successes, trials, confidence=0.95, relative=False):
+    low, high = wilson_interval(successes, trials, confidence)
+    half_width = (high - low) / 2
+    if relative:
+        p = np.asarray(successes, dtype=np.float64) / trials
+        half_width = np.divide(half_width, p, out=np.full_like(half_width, np.inf), where=p > 0)
+    return float(np.max(half_width))
+
+# Half-width of the z confidence interval for the mean, from a Moments accumulator
+def mean_precision(moments, confidence=0.95, relative=False):
+    if moments.count < 2: return float('inf')
+    mean = moments.mean
+    low, high = z_interval(mean, moments.std, moments.count, confidence)
+    half_width = (high - low) / 2
+    if relative: return float(half_width / abs(mean)) if mean else float('inf')
+    return float(half_width)
+
+# Sizes of the batches for a budget of max_trials, doubling from first_batch
+def batch_sizes(max_trials, first_batch=2**12, max_batch=2**20):
+    size, remaining = max(1, min(first_batch, max_batch)), max_trials
+    while remaining > 0:
+        yield min(size, remaining)
+        remaining -= size
+        size = min(2*size, max_batch)
+
+# Run task(batch_trials, rng, *args) batch by batch, merging the partial results,
+# until precision(total, trials) <= tolerance or time_budget seconds have passed,
+# at most max_trials trials in all. Either stopping rule may be None, not both
+def run_adaptive(task, max_trials, precision, tolerance=None, time_budget=None, seed=None,
+    first_batch=2**12, max_batch=2**20, args=(), merge=merge_results):
+    if tolerance is None and time_budget is None: raise ValueError("Need a tolerance or a time budget to stop on")
+    if max_trials <= 0: raise ValueError("Number of trials must be positive")
+    seed = seed_sequence(seed)
+
+    start = time.perf_counter()
+    total, trials, stopped = None, 0, 'max_trials'
+    for size in batch_sizes(max_trials, first_batch, max_batch):
+        partial = task(size, np.random.default_rng(seed.spawn(1)[0]), *args)
+        total = partial if total is None else merge(total, partial)
+        trials += size
+        achieved = precision(total, trials)
+        if tolerance is not None and achieved <= tolerance:
+            stopped = 'tolerance'
+            break
+        if time_budget is not None and time.perf_counter() - start >= time_budget:
+            stopped = 'time_budget'
+            break
+    return AdaptiveRun(total, trials, achieved, stopped)
@@ -0,0 +1,217 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+'''
+Benchmark harness
+-----------------
+Runs every experiment entry point at several scales (trial counts, or population
+sizes for the experiments that take one) and records wall time, trials/sec, peak
+RSS and allocations. Each (experiment, scale) case runs in a fresh interpreter so
+peak RSS belongs to that case alone. Results are written as JSON, and a previous
+run passed as the baseline flags every case that got slower or bigger than the
+threshold allows
+
+    python -m probtools.bench --scales 1e4 1e6 1e8 --output bench.json
+    python -m probtools.bench --baseline bench.json --threshold 0.2
+'''
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Experiment scripts by short name, loaded from their paths since the folders have spaces
+SCRIPTS = {
+    'binomial' : "Binomial Coefficient/src.py",
+    'random' : "Random Number Distributions/Suy_Devin_Src.py",
+    'confidence' : "Confidence Intervals/Suy_Devin_Src.py",
+    'uniform' : "Continuous Uniform Distributions/Suy_Devin_Src.py",
+    'gaussian' : "Gaussian Distributions/Suy_Devin_Src.py",
+}
+
+# Maps each entry point to (script, keyword receiving the scale, fixed keywords,
+# largest scale it is run at). The caps keep the loop-only experiments and the ones
+# holding every value in memory within a few seconds and a few GB
+CASES = {
+    'party_support' : ('binomial', 'trials', {'batched' : True}, 10**8),
+    'class_select' : ('binomial', 'trials', {}, 10**5),
+    'lottery' : ('binomial', 'trials', {'batched' : True}, 10**8),
+    'exact_tosses' : ('random', 'N', {'vectorized' : True}, 10**8),
+    'unfair_die' : ('random', 'N', {}, 10**8),
+    'rolls_to_target' : ('random', 'N', {'vectorized' : True}, 10**8),
+    'normal_studT' : ('confidence', 'num_trials', {'vectorized' : True}, 10**6),
+    'sample_size_confidence' : ('confidence', 'N', {}, 10**8),
+    'psuedo_rand' : ('uniform', 'n', {}, 10**8),
+    'uniform_eq' : ('uniform', 'n', {}, 10**7),
+    'semi_circle' : ('uniform', 'n', {'vectorized' : True}, 10**8),
+    'run_book_simu' : ('gaussian', 'N', {'sweep' : True}, 10**8),
+    'run_carton_simu' : ('gaussian', 'N', {}, 10**8),
+}
+
+# Entry points without a verbose flag (they print nothing) or without a seed
+QUIET = {'unfair_die', 'sample_size_confidence'}
+UNSEEDED = {'class_select', 'uniform_eq'}
+
+# Metrics compared against the baseline, larger is worse for each
+REGRESSION_METRICS = ('wall_time', 'peak_rss_kb', 'alloc_peak_bytes')
+
+# Scale of the untimed warm-up run, which pays for lazy imports and first-call setup
+WARMUP_SCALE = 1000
+
+# Meaning of each record field, written into the report
+FIELDS = {
+    'wall_time' : "fastest of the timed runs, in seconds, after an untimed warm-up run",
+    'trials_per_sec' : "scale divided by wall_time",
+    'peak_rss_kb' : "peak resident set size of the process running the case, in KB",
+    'alloc_peak_bytes' : "peak memory traced by tracemalloc during a separate run",
+    'alloc_blocks' : "memory blocks still held when the traced run returns, not the number of allocations made",
+}
+
+# Load an experiment script by path, registered in sys.modules so worker
+# processes can find the task functions it hands to run_trials
+def load_script(key):
+    name = "bench_" + key
+    if name in sys.modules: return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, SCRIPTS[key]))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def case_kwargs(case, scale, seed=0):
+    script, scale_key, fixed, _ = CASES[case]
+    kwargs = dict(fixed, seed=seed)
+    kwargs[scale_key] = scale
+    if case in UNSEEDED: del kwargs['seed']
+    if case not in QUIET: kwargs['verbose'] = False
+    return kwargs
+
+# Peak resident set size of this process in KB (ru_maxrss is in bytes on macOS)
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# Measure one case in this process. An untimed warm-up run at a small scale first
+# pays for lazy imports, then the fastest of at least two untraced runs is kept.
+# Allocations come from one more run under tracemalloc since tracing slows
+# allocation heavy code. alloc_blocks is the number of blocks still held when
+# the run returns
+def measure(case, scale, repeat=2, allocations=True):
+    function = getattr(load_script(CASES[case][0]), case)
+    kwargs = case_kwargs(case, scale)
+    function(**case_kwargs(case, min(scale, WARMUP_SCALE)))
+    times = []
+    for _ in range(max(2, repeat)):
+        start = time.perf_counter()
+        function(**kwargs)
+        times.append(time.perf_counter() - start)
+    wall_time = min(times)
+    record = {
+        'case' : case, 'scale' : scale, 'wall_time' : wall_time,
+        'trials_per_sec' : scale / max(wall_time, 1e-9), 'peak_rss_kb' : peak_rss_kb(),
+    }
+    if allocations:
+        tracemalloc.start()
+        result = function(**kwargs)
+        snapshot = tracemalloc.take_snapshot()
+        record['alloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        record['alloc_blocks'] = sum(stat.count for stat in snapshot.statistics('filename'))
+        tracemalloc.stop()
+        del result
+    return record
+
+# Run one case in a fresh interpreter and return its record
+def run_case(case, scale, repeat=2, allocations=True):
+    command = [sys.executable, "-m", "probtools.bench", "--child", case, str(scale), "--repeat", str(repeat)]
+    if not allocations: command.append("--no-alloc")
+    # Cached results would time the cache, not the experiment
+    env = dict(os.environ, PROBTOOLS_NO_CACHE="1")
+    proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'case' : case, 'scale' : scale, 'error' : proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def git_commit():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return proc.stdout.strip() or None
+    except OSError: return None
+
+def run_suite(cases=None, scales=(10**4, 10**5, 10**6), repeat=2, allocations=True, log=print):
+    records = []
+    for case in cases or CASES:
+        for scale in scales:
+            if scale > CASES[case][3]:
+                records.append({'case' : case, 'scale' : scale, 'skipped' : "above the " + format(CASES[case][3], ",") + " cap"})
+                continue
+            record = run_case(case, scale, repeat, allocations)
+            records.append(record)
+            if log: log(format_record(record))
+    return {
+        'commit' : git_commit(), 'timestamp' : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python' : platform.python_version(), 'numpy' : np.__version__, 'machine' : platform.machine(),
+        'cpus' : os.cpu_count(), 'fields' : FIELDS, 'results' : records,
+    }
+
+def format_record(record):
+    line = "   " + record['case'].ljust(24) + format(record['scale'], ",").rjust(13)
+    if 'error' in record: return line + "  ERROR " + " ".join(record['error'])
+    if 'skipped' in record: return line + "  skipped"
+    return (line + "  " + format(record['wall_time'], "9.3f") + " s"
+        + "  " + format(round(record['trials_per_sec']), ",").rjust(14) + " trials/s"
+        + "  " + format(record['peak_rss_kb'] // 1024, ",").rjust(6) + " MB RSS")
+
+# Cases of report whose metrics grew by more than threshold (a fraction) over the
+# same case and scale in baseline. Returns a list of
+# (case, scale, metric, baseline value, new value)
+def find_regressions(report, baseline, threshold=0.2):
+    previous = {(r['case'], r['scale']) : r for r in baseline['results']}
+    regressions = []
+    for record in report['results']:
+        old = previous.get((record['case'], record['scale']))
+        if old is None: continue
+        for metric in REGRESSION_METRICS:
+            if metric in record and old.get(metric) and record[metric] > old[metric] * (1 + threshold):
+                regressions.append((record['case'], record['scale'], metric, old[metric], record[metric]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the experiment entry points")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="entry points to run, all by default")
+    parser.add_argument("--scales", nargs="+", default=["1e4", "1e5", "1e6"], help="trial counts or population sizes")
+    parser.add_argument("--repeat", type=int, default=2, help="timed runs per case (at least 2), the fastest is kept")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", default="bench.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed growth over the baseline")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "SCALE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        case, scale = args.child
+        print(json.dumps(measure(case, int(scale), args.repeat, not args.no_alloc)))
+        return 0
+
+    scales = [int(float(scale)) for scale in args.scales]
+    print("Benchmarks\n----------")
+    report = run_suite(args.cases, scales, args.repeat, not args.no_alloc)
+    with open(args.output, "w") as f: json.dump(report, f, indent=2)
+    print("Report written to", args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        regressions = find_regressions(report, baseline, args.threshold)
+        print("\nRegressions past " + str(round(args.threshold*100)) + "% against", args.baseline)
+        for case, scale, metric, old, new in regressions:
+            print("   " + case + " @ " + format(scale, ",") + ": " + metric + " " + format(old, ".6g") + " -> " + format(new, ".6g"))
+        if not regressions: print("   none")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
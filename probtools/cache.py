@@ -0,0 +1,166 @@
+from collections import defaultdict
+from dataclasses import fields
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+
+from probtools.results import ExperimentResult
+
+'''
+Result cache
+------------
+Experiment results are stored on disk keyed by the function name, its normalized
+parameters (seed included) and a hash of the code that produced them: the
+function's source file and every probtools module. Arrays are kept as raw .npy
+entries of one .npz file, everything else as a JSON entry beside them. When the
+store outgrows its size limit the least recently used results are deleted.
+
+Only reproducible calls are cached: a function with a seed parameter needs a seed,
+and a time budget makes the result depend on timing. Pass use_cache=False to a
+cached function, or set PROBTOOLS_NO_CACHE=1, to bypass the cache. A function
+that prints its results with verbose=True passes the function printing them as
+report, so a cached result is reported just as a computed one
+'''
+# Store used when PROBTOOLS_RESULT_CACHE is unset, and its default size limit
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "probtools", "results")
+DEFAULT_MAX_BYTES = 2**30
+
+# Parameters that never change a result
+IGNORED_PARAMS = {'verbose', 'workers'}
+
+PROBTOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Hits, misses and bypassed calls of each cached function in this process
+_stats = defaultdict(lambda: {'hits' : 0, 'misses' : 0, 'bypassed' : 0})
+
+def default_cache():
+    return os.environ.get("PROBTOOLS_RESULT_CACHE", DEFAULT_CACHE)
+
+def max_cache_bytes():
+    return int(os.environ.get("PROBTOOLS_RESULT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+def cache_disabled():
+    return os.environ.get("PROBTOOLS_NO_CACHE", "") not in ("", "0")
+
+@functools.lru_cache(maxsize=None)
+def code_version(source_file):
+    digest = hashlib.sha1()
+    for path in [source_file] + sorted(glob.glob(os.path.join(PROBTOOLS_DIR, "*.py"))):
+        with open(path, "rb") as f: digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# JSON friendly form of a parameter value, arrays and tuples become lists
+def normalize(value):
+    if isinstance(value, np.random.SeedSequence): return [value.entropy, list(value.spawn_key)]
+    if isinstance(value, np.ndarray): return normalize(value.tolist())
+    if isinstance(value, (range, tuple, list)): return [normalize(v) for v in value]
+    if isinstance(value, dict): return sorted(([normalize(k), normalize(v)] for k, v in value.items()), key=repr)
+    if isinstance(value, np.generic): return value.item()
+    return value
+
+# Encode a result as JSON friendly values, moving arrays into arrays by name. Dicts
+# keep their key types (int sample sizes, float confidences) as [key, value] pairs
+def encode(value, arrays):
+    if isinstance(value, ExperimentResult):
+        return {'__result__' : {f.name : encode(getattr(value, f.name), arrays) for f in fields(value)}}
+    if isinstance(value, np.ndarray):
+        name = "array_" + str(len(arrays))
+        arrays[name] = value
+        return {'__array__' : name}
+    if isinstance(value, np.generic): return value.item()
+    if isinstance(value, dict): return {'__dict__' : [[encode(k, arrays), encode(v, arrays)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple)): return [encode(v, arrays) for v in value]
+    return value
+
+def decode(value, arrays):
+    if isinstance(value, list): return [decode(v, arrays) for v in value]
+    if not isinstance(value, dict): return value
+    if '__array__' in value: return arrays[value['__array__']]
+    if '__result__' in value: return ExperimentResult(**{k : decode(v, arrays) for k, v in value['__result__'].items()})
+    return {decode(k, arrays) : decode(v, arrays) for k, v in value['__dict__']}
+
+def save_entry(path, result):
+    arrays = {}
+    meta = json.dumps(encode(result, arrays)).encode()
+    arrays['__meta__'] = np.frombuffer(meta, dtype=np.uint8)
+    tmp_path = path[:-len(".npz")] + "." + str(os.getpid()) + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def load_entry(path):
+    with np.load(path) as entry:
+        arrays = {name : entry[name] for name in entry.files}
+    return decode(json.loads(arrays.pop('__meta__').tobytes()), arrays)
+
+# Delete the least recently used entries (by modification time, refreshed on every
+# hit) until the store fits in max_bytes
+def evict(store_dir, max_bytes):
+    entries = []
+    for path in glob.glob(os.path.join(store_dir, "*.npz")):
+        try: entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        except OSError: continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes: break
+        try: os.remove(path)
+        except OSError: continue
+        total -= size
+
+# Decorator caching an experiment entry point. when(params) may add conditions on
+# the bound parameters for the call to be reproducible, e.g. that the seeded path
+# runs. report(result) is called on a hit when the call has verbose=True
+def cache_result(function=None, when=None, store=None, report=None):
+    if function is None: return lambda f: cache_result(f, when, store, report)
+    signature = inspect.signature(function)
+    source_file = os.path.abspath(inspect.getsourcefile(function))
+
+    @functools.wraps(function)
+    def wrapper(*args, use_cache=True, **kwargs):
+        name = function.__name__
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = bound.arguments
+        reproducible = (params.get('seed', 0) is not None and params.get('time_budget') is None
+            and (when is None or when(params)))
+        if not use_cache or not reproducible or cache_disabled():
+            _stats[name]['bypassed'] += 1
+            return function(*args, **kwargs)
+
+        key = json.dumps([name, code_version(source_file),
+            sorted([k, normalize(v)] for k, v in params.items() if k not in IGNORED_PARAMS)], default=repr)
+        store_dir = store or default_cache()
+        path = os.path.join(store_dir, name + "_" + hashlib.sha1(key.encode()).hexdigest()[:16] + ".npz")
+        if os.path.exists(path):
+            try:
+                result = load_entry(path)
+                os.utime(path)
+                _stats[name]['hits'] += 1
+                if params.get('verbose'):
+                    print("Cached result of " + name + " loaded from", path)
+                    if report: report(result)
+                return result
+            except (OSError, ValueError, KeyError): pass
+
+        _stats[name]['misses'] += 1
+        result = function(*args, **kwargs)
+        os.makedirs(store_dir, exist_ok=True)
+        save_entry(path, result)
+        evict(store_dir, max_cache_bytes())
+        return result
+    return wrapper
+
+# Hit, miss and bypass counts with the hit rate for each cached function
+def cache_stats():
+    stats = {}
+    for name, counts in _stats.items():
+        looked_up = counts['hits'] + counts['misses']
+        stats[name] = dict(counts, hit_rate=counts['hits'] / looked_up if looked_up else 0.0)
+    return stats
+
+# Delete every cached result in store_dir
+def clear_cache(store_dir=None):
+    for path in glob.glob(os.path.join(store_dir or default_cache(), "*.npz")): os.remove(path)
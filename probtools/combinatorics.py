@@ -0,0 +1,74 @@
+from functools import lru_cache
+from math import lgamma
+from scipy.special import gammaln
+import numpy as np
+
+'''
+Exact and log-space binomial coefficients nCr
+'''
+# Every nCr with n <= PASCAL_MAX fits in a signed 64 bit integer
+PASCAL_MAX = 66
+
+# Largest n whose log(k!) table is cached, larger n use lgamma directly
+LOG_TABLE_MAX = 2**20
+
+# Memoized Pascal triangle, row n holds nCr for r = [0:n] (zero past r = n)
+@lru_cache(maxsize=1)
+def pascal_table():
+    table = np.zeros((PASCAL_MAX+1, PASCAL_MAX+1), dtype=np.int64)
+    table[:, 0] = 1
+    for n in range(1, PASCAL_MAX+1):
+        table[n, 1:n+1] = table[n-1, 0:n] + table[n-1, 1:n+1]
+    return table
+
+# Exact integer nCr using the multiplicative formula, each partial product
+# is itself a binomial coefficient so the integer division is always exact
+@lru_cache(maxsize=65536)
+def _ncr_product(n, r):
+    result = 1
+    for i in range(1, r+1): result = result * (n - r + i) // i
+    return result
+
+def ncr(n, r):
+    if r < 0 or r > n: return 0
+    if n <= PASCAL_MAX: return int(pascal_table()[n, r])
+    return _ncr_product(n, min(r, n-r))
+
+# Cached table of log(k!) for k = [0:n]
+@lru_cache(maxsize=8)
+def log_factorial_table(n):
+    return gammaln(np.arange(n+1) + 1.0)
+
+# Tables are sized to the next power of two so nearby n share one table
+def log_factorial(n):
+    if n > LOG_TABLE_MAX: return lgamma(n+1)
+    return float(log_factorial_table(max(1024, 1 << int(n).bit_length()))[n])
+
+# log(nCr), -inf when there is no way to choose r of n
+def log_ncr(n, r):
+    if r < 0 or r > n: return float('-inf')
+    r = min(r, n-r)
+    # Past the table, lgamma(n+1) is so large that subtracting the other terms
+    # loses digits, so small r sums the r factors of the product formula instead
+    if n > LOG_TABLE_MAX and r <= 10000:
+        i = np.arange(r)
+        return float(np.sum(np.log(n - i) - np.log(i + 1.0)))
+    return log_factorial(n) - log_factorial(r) - log_factorial(n-r)
+
+# log(nCr) over arrays of (n, r), broadcast together; -inf where r is out of range
+def log_ncr_array(n, r):
+    n, r = np.broadcast_arrays(np.asarray(n, dtype=np.float64), np.asarray(r, dtype=np.float64))
+    valid = (r >= 0) & (r <= n)
+    out = np.full(n.shape, -np.inf)
+    out[valid] = gammaln(n[valid] + 1) - gammaln(r[valid] + 1) - gammaln(n[valid] - r[valid] + 1)
+    return out
+
+# nCr over arrays of (n, r). Exact int64 values come from the Pascal table when
+# every n fits, otherwise float64 values are recovered from log space
+def ncr_array(n, r):
+    n, r = np.broadcast_arrays(np.asarray(n), np.asarray(r))
+    valid = (r >= 0) & (r <= n)
+    if np.issubdtype(n.dtype, np.integer) and np.issubdtype(r.dtype, np.integer) \
+        and (n.size == 0 or (n.min() >= 0 and n.max() <= PASCAL_MAX)):
+        return np.where(valid, pascal_table()[n, np.where(valid, r, 0)], 0)
+    return np.exp(log_ncr_array(n, r))
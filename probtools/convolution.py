@@ -0,0 +1,49 @@
+import numpy as np
+
+'''
+Exact distributions of sums of independent variables by convolution
+'''
+# Shorter PMF length above which method='auto' convolves by FFT, below it the
+# direct sum is faster
+FFT_MIN_LENGTH = 64
+
+# PMF of X + Y for independent X, Y on integer lattices. method is 'direct'
+# (np.convolve), 'fft' (np.fft over a power of two length), or 'auto' to pick
+# the faster one. FFT round-off can leave values around -1e-17, those are
+# clipped to zero
+def convolve_pmf(p, q, method='auto'):
+    p, q = np.asarray(p, dtype=np.float64), np.asarray(q, dtype=np.float64)
+    if method not in ('auto', 'direct', 'fft'): raise ValueError("Unknown convolution method " + repr(method))
+    if method == 'auto': method = 'fft' if min(p.size, q.size) > FFT_MIN_LENGTH else 'direct'
+    if method == 'direct': return np.convolve(p, q)
+    size = p.size + q.size - 1
+    length = 1 << (size - 1).bit_length()
+    return np.clip(np.fft.irfft(np.fft.rfft(p, length) * np.fft.rfft(q, length), length)[:size], 0, None)
+
+# PMF of the sum of k iid copies of a variable with the given PMF, using
+# exponentiation by squaring so only O(log k) convolutions are needed.
+# If pmf[0] is the probability of value lo, the result starts at k*lo
+def sum_pmf(pmf, k, method='auto'):
+    if k < 0: raise ValueError("Number of summed variables must be non-negative")
+    result = np.ones(1)
+    base = np.asarray(pmf, dtype=np.float64)
+    while k:
+        if k & 1: result = convolve_pmf(result, base, method)
+        k >>= 1
+        if k: base = convolve_pmf(base, base, method)
+    return result
+
+# Exact distribution of the sum of k fair dice with the given number of sides,
+# returns (values [k : k*sides], probabilities)
+def dice_sum_pmf(k, sides=6, method='auto'):
+    return np.arange(k, k*sides + 1), sum_pmf(np.full(sides, 1/sides), k, method)
+
+# Discretized Irwin-Hall density for the sum of n iid uniforms over [a, b].
+# Each uniform is replaced by equally weighted masses at its cell midpoints,
+# the sum of those is exact by convolution and matches the continuous sum up to
+# O(1/cells^2) in variance. Returns (x, density) on the lattice of attainable sums
+def irwin_hall_pdf(n, a=0, b=1, cells=1000, method='auto'):
+    h = (b - a) / cells
+    pmf = sum_pmf(np.full(cells, 1/cells), n, method)
+    x = n * (a + h/2) + h * np.arange(pmf.size)
+    return x, pmf / h
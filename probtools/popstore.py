@@ -0,0 +1,64 @@
+import hashlib
+import os
+import numpy as np
+
+'''
+Population store
+----------------
+Populations are kept as contiguous float64 arrays. With a store directory they
+are written once as .npy files keyed by distribution, parameters, size and seed,
+then opened read-only with memory mapping, so a population of 10^9 values is
+generated once and shared by every process that reads it
+'''
+# Store used when PROBTOOLS_POPULATION_STORE is unset
+DEFAULT_STORE = os.path.join(os.path.expanduser("~"), ".cache", "probtools", "populations")
+
+# Draws size values of each supported distribution from the generator rng
+GENERATORS = {
+    'normal' : lambda rng, size, mu=0, sigma=1: rng.normal(mu, sigma, size),
+    'uniform' : lambda rng, size, a=0, b=1: rng.uniform(a, b, size),
+    'exponential' : lambda rng, size, beta=1: rng.exponential(beta, size),
+}
+
+def default_store():
+    return os.environ.get("PROBTOOLS_POPULATION_STORE", DEFAULT_STORE)
+
+# File holding the population for the given key inside store_dir
+def population_path(store_dir, dist, N, seed, params):
+    key = repr((dist, int(N), seed, sorted(params.items())))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(store_dir, dist + "_" + str(N) + "_" + digest + ".npy")
+
+# Population of N values of dist, generated chunk_size values at a time from
+# one seeded stream so the result does not depend on chunk_size
+def generate_population(dist, N, seed=None, out=None, chunk_size=2**24, **params):
+    if dist not in GENERATORS: raise ValueError("Unsupported distribution: " + str(dist))
+    rng = np.random.default_rng(seed)
+    if out is None: out = np.empty(N)
+    for start in range(0, N, chunk_size):
+        stop = min(start + chunk_size, N)
+        out[start:stop] = GENERATORS[dist](rng, stop - start, **params)
+    return out
+
+# Read-only memory-mapped population from the store, generated on first use.
+# The file is written under a temporary name and renamed into place, so readers
+# in other processes never see a partially written population
+def load_population(dist, N, seed, store_dir=None, chunk_size=2**24, **params):
+    if seed is None: raise ValueError("Stored populations need a seed to be reproducible")
+    store_dir = store_dir or default_store()
+    path = population_path(store_dir, dist, N, seed, params)
+    if not os.path.exists(path):
+        os.makedirs(store_dir, exist_ok=True)
+        tmp_path = path[:-len(".npy")] + "." + str(os.getpid()) + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(N,))
+        generate_population(dist, N, seed, out, chunk_size, **params)
+        out.flush()
+        del out
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+# In-memory population, or a stored one when store is True or a directory path
+def make_population(dist, N, seed=None, store=None, **params):
+    if store:
+        return load_population(dist, N, seed, None if store is True else store, **params)
+    return generate_population(dist, N, seed, **params)
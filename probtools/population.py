@@ -0,0 +1,66 @@
+import random
+import numpy as np
+from probtools.sampling import AliasSampler
+
+# numpy's multivariate hypergeometric only accepts populations below this size
+MAX_HYPERGEOMETRIC = 10**9
+
+# A population described only by how many members fall in each category,
+# e.g. Population({'A' : 500, 'B' : 300, 'C' : 200}). Nothing is stored per
+# person, so memory is O(categories) no matter how large the population is,
+# and because every draw is uniformly random there is nothing to shuffle
+class Population:
+    def __init__(self, counts):
+        self.categories = list(counts.keys())
+        self.counts = [int(counts[c]) for c in self.categories]
+        if any(c < 0 for c in self.counts):
+            raise ValueError("Category counts must be non-negative")
+        self.size = sum(self.counts)
+        self._alias = None
+
+    def __len__(self): return self.size
+
+    # Draw k members without replacement and return their categories in
+    # draw order, the count-based equivalent of random.sample(population, k)
+    def sample(self, k, rng=random):
+        if k > self.size: raise ValueError("Sample larger than population")
+        remaining = list(self.counts)
+        total = self.size
+        drawn = []
+        for _ in range(k):
+            # Walk the categories until the selected member is reached
+            r = rng.randrange(total)
+            i = 0
+            while r >= remaining[i]:
+                r -= remaining[i]
+                i += 1
+            remaining[i] -= 1
+            total -= 1
+            drawn.append(self.categories[i])
+        return drawn
+
+    # Draw size independent samples of k members (each without replacement),
+    # returns a (size, categories) array counting the members of each category
+    def sample_counts(self, k, size, rng=None):
+        rng = np.random.default_rng(rng)
+        if k > self.size: raise ValueError("Sample larger than population")
+        colors = np.array(self.counts, dtype=np.int64)
+        if self.size < MAX_HYPERGEOMETRIC:
+            return rng.multivariate_hypergeometric(colors, k, size=size)
+
+        # Populations too large for numpy: draw the k members one position at a
+        # time for every sample at once, removing each from its sample's counts
+        remaining = np.tile(colors, (size, 1))
+        drawn = np.zeros_like(remaining)
+        rows = np.arange(size)
+        for j in range(k):
+            r = rng.integers(0, self.size - j, size=size)
+            idx = np.count_nonzero(np.cumsum(remaining, axis=1) <= r[:, None], axis=1)
+            remaining[rows, idx] -= 1
+            drawn[rows, idx] += 1
+        return drawn
+
+    # Draw size members with replacement, returns an array of categories
+    def choice(self, size, rng=None):
+        if self._alias is None: self._alias = AliasSampler(self.counts)
+        return np.asarray(self.categories)[self._alias.sample(size, rng)]
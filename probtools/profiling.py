@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+import atexit
+import json
+import os
+import time
+import tracemalloc
+
+'''
+Phase profiling
+---------------
+Opt-in instrumentation of the experiments. An experiment creates a timer with
+phases(name) and calls timer.mark(phase) at the end of each of its sections
+(population, sampling, aggregation, output, render...), so a phase runs from the
+previous mark to the next. Each mark records wall and CPU time, the trials run and
+random variates drawn in the phase with the trials/sec they give, and with
+memory=True the peak traced memory above what was in use when the phase began.
+
+Profiling is off unless enable_profiling() (or the profiling() context manager)
+turns it on: phases() then returns one shared timer whose mark() does nothing.
+Setting PROBTOOLS_PROFILE to a path profiles the whole process and writes the
+JSON there on exit. CPU time covers this process only, not worker processes
+'''
+_active = None
+
+class Profile:
+    def __init__(self, callback=None, memory=False):
+        self.records = []
+        self.callback = callback
+        self.memory = memory
+        self._started_tracing = False
+
+    def record(self, record):
+        self.records.append(record)
+        if self.callback: self.callback(record)
+
+    # Totals for each (experiment, phase) over every time it ran
+    def summary(self):
+        totals = {}
+        for record in self.records:
+            key = record['experiment'] + "." + record['phase']
+            total = totals.setdefault(key, {'calls' : 0, 'wall_time' : 0.0, 'cpu_time' : 0.0, 'trials' : 0, 'draws' : 0})
+            total['calls'] += 1
+            for field in ('wall_time', 'cpu_time', 'trials', 'draws'): total[field] += record[field]
+            if 'peak_bytes' in record: total['peak_bytes'] = max(total.get('peak_bytes', 0), record['peak_bytes'])
+        for total in totals.values():
+            total['trials_per_sec'] = total['trials'] / total['wall_time'] if total['trials'] and total['wall_time'] else None
+        return totals
+
+    def to_json(self, path=None):
+        report = json.dumps({'phases' : self.records, 'summary' : self.summary()}, indent=2)
+        if path:
+            with open(path, "w") as f: f.write(report)
+        return report
+
+class PhaseTimer:
+    def __init__(self, profile, experiment):
+        self.profile = profile
+        self.experiment = experiment
+        self._start()
+
+    def _start(self):
+        if self.profile.memory:
+            tracemalloc.reset_peak()
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+
+    # End the current phase under the given name and start the next one
+    def mark(self, phase, trials=0, draws=0):
+        wall_time = time.perf_counter() - self.wall_start
+        cpu_time = time.process_time() - self.cpu_start
+        record = {
+            'experiment' : self.experiment, 'phase' : phase, 'wall_time' : wall_time, 'cpu_time' : cpu_time,
+            'trials' : int(trials), 'draws' : int(draws),
+            'trials_per_sec' : trials / wall_time if trials and wall_time > 0 else None,
+        }
+        if self.profile.memory: record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - self.memory_start
+        self.profile.record(record)
+        self._start()
+
+# Shared timer handed out while profiling is off
+class _NoTimer:
+    def mark(self, phase, trials=0, draws=0): pass
+
+_NO_TIMER = _NoTimer()
+
+# Timer for the sections of one experiment run
+def phases(experiment):
+    if _active is None: return _NO_TIMER
+    return PhaseTimer(_active, experiment)
+
+# Start recording phases, callback(record) is called as each one ends
+def enable_profiling(callback=None, memory=False):
+    global _active
+    disable_profiling()
+    _active = Profile(callback, memory)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _active._started_tracing = True
+    return _active
+
+# Stop recording and return the profile that was active, if any
+def disable_profiling():
+    global _active
+    profile, _active = _active, None
+    if profile is not None and profile._started_tracing: tracemalloc.stop()
+    return profile
+
+# Profile the body of a with statement, optionally writing the JSON to output
+@contextmanager
+def profiling(callback=None, memory=False, output=None):
+    profile = enable_profiling(callback, memory)
+    try: yield profile
+    finally:
+        disable_profiling()
+        if output: profile.to_json(output)
+
+if os.environ.get("PROBTOOLS_PROFILE"):
+    _profile_path = os.environ["PROBTOOLS_PROFILE"]
+    _process_profile = enable_profiling(memory=os.environ.get("PROBTOOLS_PROFILE_MEMORY", "") not in ("", "0"))
+    atexit.register(lambda: _process_profile.to_json(_profile_path))
@@ -0,0 +1,68 @@
+from functools import lru_cache
+from scipy.special import ndtri, stdtrit
+import numpy as np
+
+'''
+Critical values for two-sided confidence intervals: a confidence c leaves (1-c)/2
+in each tail, so the critical value is the (1+c)/2 quantile of the distribution
+'''
+# Confidence levels and degrees of freedom covered by the precomputed t table
+COMMON_CONFIDENCES = np.array([.8, .9, .95, .9545, .96, .98, .99, .995, .9973, .999])
+TABLE_DOF = 1000
+
+def _check_confidence(confidence):
+    if np.any((np.asarray(confidence) <= 0) | (np.asarray(confidence) >= 1)):
+        raise ValueError("Confidence must be strictly between 0 and 1")
+
+# Dense table of t critical values, row per common confidence, column per dof [1:TABLE_DOF]
+@lru_cache(maxsize=1)
+def t_table():
+    dof = np.arange(1, TABLE_DOF+1, dtype=np.float64)
+    return stdtrit(dof[None, :], 0.5 + COMMON_CONFIDENCES[:, None]/2)
+
+# z critical value for a single confidence level
+@lru_cache(maxsize=1024)
+def z_score(confidence):
+    _check_confidence(confidence)
+    return float(ndtri(0.5 + confidence/2))
+
+# t critical value for a single confidence level and v=dof degrees of freedom,
+# read from the dense table when covered, otherwise computed once and cached
+@lru_cache(maxsize=65536)
+def t_score(confidence, dof):
+    _check_confidence(confidence)
+    if dof <= 0: raise ValueError("Degrees of freedom must be positive")
+    row = np.flatnonzero(COMMON_CONFIDENCES == confidence)
+    if row.size and dof == int(dof) and dof <= TABLE_DOF:
+        return float(t_table()[row[0], int(dof)-1])
+    return float(stdtrit(dof, 0.5 + confidence/2))
+
+# z critical values over an array of confidence levels
+def z_scores(confidence):
+    _check_confidence(confidence)
+    return ndtri(0.5 + np.asarray(confidence, dtype=np.float64)/2)
+
+# t critical values over arrays of confidence levels and dof, broadcast together.
+# Pairs covered by the dense table are looked up, the rest are computed directly
+def t_scores(confidence, dof):
+    _check_confidence(confidence)
+    c, v = np.broadcast_arrays(np.asarray(confidence, dtype=np.float64), np.asarray(dof, dtype=np.float64))
+    if np.any(v <= 0): raise ValueError("Degrees of freedom must be positive")
+    row = np.searchsorted(COMMON_CONFIDENCES, c).clip(0, COMMON_CONFIDENCES.size-1)
+    in_table = (COMMON_CONFIDENCES[row] == c) & (v == np.floor(v)) & (v <= TABLE_DOF)
+
+    out = np.empty(c.shape)
+    out[in_table] = t_table()[row[in_table], v[in_table].astype(np.int64)-1]
+    out[~in_table] = stdtrit(v[~in_table], 0.5 + c[~in_table]/2)
+    return out
+
+# Confidence intervals over arrays of mu, sigma and n (and confidence), all
+# broadcast together, returned as (low, high) arrays
+def z_interval(mu, sigma, n, confidence):
+    margin = z_scores(confidence) * np.asarray(sigma) / np.sqrt(n)
+    return np.asarray(mu) - margin, np.asarray(mu) + margin
+
+# Uses v=n-1 degrees of freedom
+def t_interval(mu, sigma, n, confidence):
+    margin = t_scores(confidence, np.asarray(n) - 1) * np.asarray(sigma) / np.sqrt(n)
+    return np.asarray(mu) - margin, np.asarray(mu) + margin
@@ -0,0 +1,12 @@
+# matplotlib is imported the first time something is drawn rather than when the
+# experiment modules load, so computing results never pays for it or needs a display
+def pyplot():
+    import matplotlib.pyplot as plt
+    return plt
+
+# Show the current figure, with the drawing leading up to it and the time the
+# window stays open recorded as separate phases of timer
+def show(plt, timer):
+    timer.mark("render")
+    plt.show()
+    timer.mark("show")
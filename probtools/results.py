@@ -0,0 +1,18 @@
+from dataclasses import dataclass, field
+
+# Structured output of an experiment run, holding everything needed to report or
+# plot it afterwards without rerunning anything
+#   counts        : raw tallies (successes, unanimous groups, ...)
+#   probabilities : estimated probabilities, from the trials when simulated
+#   exact         : closed form values, when the experiment computed them
+#   arrays        : NumPy arrays such as histogram counts, bin edges or curves
+#   stats         : summary numbers such as means, bounds or throughput
+@dataclass
+class ExperimentResult:
+    experiment: str
+    params: dict = field(default_factory=dict)
+    counts: dict = field(default_factory=dict)
+    probabilities: dict = field(default_factory=dict)
+    exact: dict = field(default_factory=dict)
+    arrays: dict = field(default_factory=dict)
+    stats: dict = field(default_factory=dict)
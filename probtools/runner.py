@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import multiprocessing
+import os
+import numpy as np
+
+'''
+Process-pool Monte Carlo runner
+-------------------------------
+A trial budget is cut into chunks of chunk_size trials. The chunking depends only
+on the budget, never on the number of workers, and chunk i always draws from the
+i-th child of one SeedSequence, so for a given seed the merged result is identical
+however many processes run the chunks
+'''
+# Combine two partial results: objects with a merge() method use it, dicts merge
+# key by key, lists concatenate, and numbers or NumPy count arrays add
+def merge_results(a, b):
+    if hasattr(a, 'merge'): return a.merge(b)
+    if isinstance(a, dict): return {k : merge_results(a[k], b[k]) for k in a}
+    return a + b
+
+# SeedSequence for seed, which may be anything SeedSequence accepts or a SeedSequence.
+# A SeedSequence passed in is copied, spawning from the original would advance its
+# count of children and give the next call with the same seed different streams
+def seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+    return np.random.SeedSequence(seed)
+
+# Sizes of the chunks a budget of trials is split into
+def chunk_sizes(trials, chunk_size):
+    sizes = [chunk_size] * (trials // chunk_size)
+    if trials % chunk_size: sizes.append(trials % chunk_size)
+    return sizes
+
+def _run_chunk(job):
+    task, size, seed_seq, args = job
+    return task(size, np.random.default_rng(seed_seq), *args)
+
+# Fork lets workers reuse whatever the parent already loaded (populations, modules
+# loaded from paths with spaces), fall back to the platform default elsewhere
+def _pool_context():
+    if "fork" in multiprocessing.get_all_start_methods(): return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+# Run task(chunk_trials, rng, *args) over the whole budget and merge the partial
+# results in chunk order. task must be a module level function so it can be sent
+# to the workers. workers=None uses every core, workers=1 runs in this process.
+# seed may be anything SeedSequence accepts, or a SeedSequence itself
+def run_trials(task, trials, seed=None, workers=1, chunk_size=1000000, args=(), merge=merge_results):
+    sizes = chunk_sizes(trials, chunk_size)
+    if not sizes: raise ValueError("Number of trials must be positive")
+    children = seed_sequence(seed).spawn(len(sizes))
+    jobs = [(task, size, child, args) for size, child in zip(sizes, children)]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers == 1:
+        partials = map(_run_chunk, jobs)
+        return reduce(merge, partials)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+        partials = pool.map(_run_chunk, jobs)
+        return reduce(merge, partials)
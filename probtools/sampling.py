@@ -0,0 +1,41 @@
+import numpy as np
+
+# Walker/Vose alias table for drawing from a discrete distribution with
+# arbitrary non-negative float weights. The table is built once in O(k), after
+# which every draw costs one uniform index and one coin flip regardless of k
+class AliasSampler:
+    def __init__(self, weights):
+        w = np.asarray(weights, dtype=np.float64)
+        if w.ndim != 1 or w.size == 0:
+            raise ValueError("Weights must be a non-empty 1-D sequence")
+        if not np.all(np.isfinite(w)) or np.any(w < 0) or w.sum() <= 0:
+            raise ValueError("Weights must be finite, non-negative and not all zero")
+
+        # Scale so the average column holds exactly 1
+        k = w.size
+        scaled = w * (k / w.sum())
+        self.prob = np.ones(k)
+        self.alias = np.arange(k)
+
+        # Pair each underfull column with an overfull one, the overfull column
+        # donates what the underfull column is missing and becomes its alias
+        small = [i for i in range(k) if scaled[i] < 1]
+        large = [i for i in range(k) if scaled[i] >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1
+            if scaled[l] < 1: small.append(l)
+            else: large.append(l)
+        # Anything left over is full up to rounding error
+        for i in small + large: self.prob[i] = 1
+
+    def __len__(self): return self.prob.size
+
+    # Draw size outcomes, returned as indices into the weights
+    def sample(self, size, rng=None):
+        rng = np.random.default_rng(rng)
+        column = rng.integers(0, self.prob.size, size=size)
+        keep = rng.random(size) < self.prob[column]
+        return np.where(keep, column, self.alias[column])
@@ -0,0 +1,27 @@
+import os
+import sys
+import numpy as np
+
+# Shared helpers live in probtools/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from probtools.bench import load_script
+
+uniform = load_script('uniform')
+
+# The PDF is compared away from x = a and x = b, where the open interval (a, b)
+# of uniform_eq and the closed [a, b] of scipy.stats.uniform differ
+def test_uniform_eq_matches_scipy():
+    a, b, n = 1, 10, 100001
+    ours = uniform.uniform_eq(a, b, n, verbose=False).arrays
+    scipy = uniform.uniform_stats(a, b, n).arrays
+    interior = (ours['x'] != a) & (ours['x'] != b)
+
+    assert np.allclose(ours['x'], scipy['x'])
+    assert np.allclose(ours['pdf'][interior], scipy['pdf'][interior])
+    assert np.allclose(ours['cdf'], scipy['cdf'])
+
+def test_uniform_eq_endpoints():
+    pdf = uniform.get_uni_pdf([0, 1, 5, 10, 11], 1, 10)
+    cdf = uniform.get_uni_cdf([0, 1, 5, 10, 11], 1, 10)
+    assert np.allclose(pdf, [0, 0, 1/9, 0, 0])
+    assert np.allclose(cdf, [0, 0, 4/9, 1, 1])